@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+from ratelimit import INTERACTIVE, Ticket, as_ticket
+
+# How long detail lookups are collected before being sent as one query
+BATCH_WINDOW = float(os.getenv("VNDB_BATCH_WINDOW_MS", "5")) / 1000
+# The Kana API returns at most 100 results per page
+BATCH_MAX_SIZE = 100
+
+
+def id_filter(ids):
+    if len(ids) == 1:
+        return ["id", "=", ids[0]]
+    return ["or", *(["id", "=", i] for i in ids)]
+
+
+class DetailBatcher:
+    def __init__(self, send, window=BATCH_WINDOW, max_size=BATCH_MAX_SIZE):
+        # send(endpoint, filters, fields, results, priority) -> response dict
+        self._send = send
+        self.window = window
+        self.max_size = max_size
+        self.batches = 0
+        self.batched_ids = 0
+        # (endpoint, fields, priority) -> ({id: future}, timer handle, ticket of the whole batch)
+        self._pending = {}
+
+    async def load(self, endpoint, fields, item_id, priority=INTERACTIVE):
+        ticket = as_ticket(priority)
+        group = (endpoint, fields, ticket.priority)
+        loop = asyncio.get_running_loop()
+        if group not in self._pending:
+            self._pending[group] = ({}, loop.call_later(self.window, self._flush, group), Ticket(ticket.priority))
+
+        futures, _, batch_ticket = self._pending[group]
+        # The batch is sent at the highest priority any of its ids is raised to
+        ticket.listen(lambda: batch_ticket.raise_to(ticket.priority))
+        future = futures.get(item_id)
+        if future is None:
+            future = futures[item_id] = loop.create_future()
+            if len(futures) >= self.max_size:
+                self._flush(group)
+        return await future
+
+    def _flush(self, group):
+        futures, handle, ticket = self._pending.pop(group, (None, None, None))
+        if futures:
+            handle.cancel()
+            asyncio.ensure_future(self._dispatch(group, futures, ticket))
+
+    async def _dispatch(self, group, futures, ticket):
+        endpoint, fields, _ = group
+        ids = list(futures)
+        request_fields = fields if "id" in {f.strip() for f in fields.split(",")} else f"id,{fields}"
+        self.batches += 1
+        self.batched_ids += len(ids)
+
+        try:
+            data = await self._send(endpoint, id_filter(ids), request_fields, len(ids), ticket)
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_id = {result.get('id'): result for result in data.get('results', [])}
+        for item_id, future in futures.items():
+            if not future.done():
+                future.set_result(by_id.get(item_id))
@@ -0,0 +1,45 @@
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import DESCRIPTION_LIMIT, format_description
+
+# Shaped after long VNDB descriptions: several paragraphs, links, spoilers and a source note
+PARAGRAPH = (
+    "Kaito wakes up in the flooded underwater theme park [url=/v17]LeMU[/url] with no memory of who he is. "
+    "Together with [url=/c1234]Tsugumi[/url] and four others he has 119 hours before the facility collapses. "
+    "[spoiler]None of them are who they claim to be, and the date on the wall clock is wrong.[/spoiler] "
+    "The story branches into [b]two[/b] protagonists whose routes must both be finished before the "
+    "[i]true ending[/i] unlocks.\n\n"
+)
+DESCRIPTIONS = [
+    PARAGRAPH * n + f"[From [url=https://example.org/vn/{n}]the official website[/url]]"
+    for n in range(4, 24, 2)
+]
+
+
+def format_description_regex(description):
+    # The previous implementation, kept for comparison
+    if description is None:
+        return "N/A"
+    url_pattern = re.compile(r'\[url=(https?://[^\]]+)\](.*?)\[/url\]')
+    relative_url_pattern = re.compile(r'\[url=/([^\]]+)\](.*?)\[/url\]')
+    formatted_description = re.sub(url_pattern, r'[\2](\1)', description)
+    return re.sub(relative_url_pattern, r'[\2](https://vndb.org/\1)', formatted_description)
+
+
+def run(name, func, number=200):
+    seconds = min(timeit.repeat(lambda: [func(d) for d in DESCRIPTIONS], number=number, repeat=5))
+    calls = number * len(DESCRIPTIONS)
+    size = sum(map(len, DESCRIPTIONS)) * number
+    print(f"{name:<32} {seconds / calls * 1e6:8.1f} us/call  {size / seconds / 1e6:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    print(f"{len(DESCRIPTIONS)} descriptions, {min(map(len, DESCRIPTIONS))}-{max(map(len, DESCRIPTIONS))} chars")
+    run("regex (url only)", format_description_regex)
+    run("tokenizer, uncached", lambda d: format_description.__wrapped__(d, DESCRIPTION_LIMIT))
+    run("tokenizer, memoized", format_description, number=20000)
@@ -0,0 +1,87 @@
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from embeds import EMBED_COLOR, build_embed
+from formatting import format_description, truncate_text
+from languages import LANGUAGE_TO_FLAG
+from records import VNDetails, format_length
+
+ENTRIES = 2000
+
+VN_INFO = {
+    "title": "Ever17 -the out of infinity-",
+    "alttitle": "Ever17 -the out of infinity-",
+    "titles": [{"title": "Ever17 -the out of infinity-", "lang": "ja"}, {"title": "Ever17", "lang": "en"}, {"title": "Ever17", "lang": "zh-Hans"}],
+    "description": "Kaito wakes up in [url=/v17]LeMU[/url]. [spoiler]Nothing is what it seems.[/spoiler]\n" * 12,
+    "relations": [{"id": f"v{i}", "relation": "seq", "title": f"Infinity Sequel {i}"} for i in range(6)],
+    "platforms": ["win", "ps2", "psp", "xb3", "ios", "and"],
+    "image": {"url": "https://t.vndb.org/cv/00/1000.jpg"},
+    "length": 4,
+    "length_minutes": 2145,
+    "languages": ["ja", "en", "zh-Hans", "ko", "ru"],
+}
+
+
+def old_details(vn_info):
+    # What fetch_vn_details used to return
+    related_media = vn_info.get('relations', [])
+    return {
+        "title": vn_info.get('title', 'N/A'),
+        "original_title": vn_info.get('alttitle', 'N/A'),
+        "alternate_names": [t.get('title', 'N/A') for t in vn_info.get('titles', []) if t.get('lang') != 'ja'],
+        "description": format_description(vn_info.get('description', 'N/A')),
+        "related_vns": ", ".join([f"[{rel['title']}](https://vndb.org/{rel['id']})" for rel in related_media]) if related_media else "N/A",
+        "platforms": vn_info.get('platforms', []),
+        "cover": vn_info.get('image', {}).get('url', 'N/A'),
+        "length": format_length(vn_info.get('length_minutes')),
+        "languages": vn_info.get('languages', []),
+    }
+
+
+def old_embed(vn_id, vn_details):
+    embed = discord.Embed(title=vn_details['title'], url=f"https://vndb.org/{vn_id}", description=vn_details['description'], color=EMBED_COLOR)
+    embed.set_thumbnail(url=vn_details['cover'])
+    embed.add_field(name="🏷️ __Original Name:__", value=truncate_text(vn_details['original_title']), inline=False)
+    embed.add_field(name="🔄 __Alternate Names:__", value=truncate_text(", ".join(vn_details['alternate_names']) if vn_details['alternate_names'] else "N/A"), inline=False)
+    embed.add_field(name="⏳ __Playtime:__", value=truncate_text(vn_details['length']), inline=False)
+    embed.add_field(name="🌐 __Languages:__", value=truncate_text(" ".join(LANGUAGE_TO_FLAG.get(lang, '🏳️') for lang in vn_details['languages'])), inline=False)
+    embed.add_field(name="🎮 __Platforms:__", value=truncate_text(", ".join(vn_details['platforms'])), inline=False)
+    embed.add_field(name="🔗 __Related Media:__", value=truncate_text(vn_details['related_vns']), inline=False)
+    return embed
+
+
+def variant(i):
+    # Distinct strings per entry so interning does not hide the per-entry cost
+    return {**VN_INFO, "title": f"{VN_INFO['title']} #{i}", "alttitle": f"Ever17 #{i}"}
+
+
+def memory_per_entry(build):
+    infos = [variant(i) for i in range(ENTRIES)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entries = [build(f"v{i}", info) for i, info in enumerate(infos)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del entries
+    return used / ENTRIES
+
+
+if __name__ == "__main__":
+    print(f"memory per entry   dict: {memory_per_entry(lambda vn_id, info: old_details(info)):7.0f} B")
+    print(f"                 record: {memory_per_entry(VNDetails.from_api):7.0f} B")
+
+    details = old_details(VN_INFO)
+    record = VNDetails.from_api("v17", VN_INFO)
+    number = 20000
+    for name, func in (
+        ("inline build", lambda: old_embed("v17", details)),
+        ("build_embed, cached", lambda: build_embed(record, "vn")),
+    ):
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:<22} {seconds / number * 1e6:7.1f} us/embed")
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The real budget would throttle the run to under one request a second, the mock server has no limit
+os.environ.setdefault("VNDB_RATE_LIMIT_REQUESTS", "1000000")
+os.environ.setdefault("VNDB_RATE_LIMIT_PERIOD", "1")
+
+import discord
+
+import main
+from mock_vndb import CATALOGUE_SIZE, fake_vn
+from metrics import VNDB_LATENCY
+from views import select_handlers
+
+SCENARIOS = ("vn", "character", "cover", "randomvn")
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _acknowledge(self):
+        if self._done:
+            raise RuntimeError(f"interaction {self._interaction.id} was already responded to")
+        await asyncio.sleep(self._interaction.discord_latency)
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self._acknowledge()
+        self._interaction.replies.append((content, kwargs))
+
+    async def defer(self, **kwargs):
+        await self._acknowledge()
+
+    async def edit_message(self, content=None, **kwargs):
+        await self._acknowledge()
+        self._interaction.replies.append((content, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        if not self._interaction.response.is_done():
+            raise RuntimeError(f"followup sent before interaction {self._interaction.id} was acknowledged")
+        await asyncio.sleep(self._interaction.discord_latency)
+        self._interaction.replies.append((content, kwargs))
+
+
+# Stands in for discord.Interaction, with only what the handlers touch
+class FakeInteraction:
+    _ids = itertools.count(1)
+
+    def __init__(self, discord_latency=0.0):
+        self.id = next(self._ids)
+        self.created_at = discord.utils.utcnow()
+        self.type = discord.InteractionType.application_command
+        self.channel = None
+        self.extras = {}
+        self.replies = []
+        self.discord_latency = discord_latency
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def delete_original_response(self):
+        await asyncio.sleep(self.discord_latency)
+
+
+def selected_id(interaction):
+    # The first option of the dropdown a search answered with
+    for _, kwargs in interaction.replies:
+        view = kwargs.get("view")
+        for item in getattr(view, "children", ()):
+            # Persistent components are DynamicItems wrapping the actual select
+            options = getattr(getattr(item, "item", item), "options", None)
+            if options:
+                return options[0].value
+    return None
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.queries = [f"title {i}" for i in range(args.queries)]
+        # kind -> list of seconds
+        self.latencies = {}
+        self.errors = 0
+        self.deferred = 0
+
+    async def timed(self, kind, handler, *handler_args):
+        interaction = FakeInteraction(self.args.discord_latency)
+        started = time.perf_counter()
+        try:
+            await handler(interaction, *handler_args)
+        except Exception as e:
+            print(f"{kind} raised {e!r}")
+            self.errors += 1
+        else:
+            if interaction.extras.get("status", "ok") != "ok" or not interaction.replies:
+                self.errors += 1
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        responder = interaction.extras.get("responder")
+        if responder is not None and responder.deferred:
+            self.deferred += 1
+        return interaction
+
+    async def flow(self, scenario):
+        if scenario == "randomvn":
+            await self.timed("randomvn", main.random_vn.callback)
+            return
+        command = {"vn": main.vn_search, "character": main.character_search, "cover": main.cover_search}[scenario]
+        interaction = await self.timed(scenario, command.callback, random.choice(self.queries))
+        choice = selected_id(interaction)
+        if choice is not None:
+            await asyncio.sleep(self.args.think_time)
+            await self.timed(f"{scenario} select", select_handlers[scenario], choice)
+
+    async def run(self):
+        pending = iter(range(self.args.flows))
+
+        async def worker():
+            for _ in pending:
+                await self.flow(random.choice(SCENARIOS))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(args):
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "bench", "mock_vndb.py"), "--port", str(port),
+        "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--retry-after", str(args.retry_after),
+    ])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    sys.exit("The mock VNDB server did not start")
+
+
+def upstream_requests():
+    return sum(count for name, _, count in VNDB_LATENCY.samples() if name.endswith("_count"))
+
+
+async def run(args):
+    main.vndb.base_url = args.base_url
+    await main.vndb.start()
+    if not args.empty_pool:
+        main.random_pool.add_many(
+            (vn["id"], vn["languages"], vn["length"], vn["platforms"]) for vn in map(fake_vn, range(1, CATALOGUE_SIZE + 1))
+        )
+    test = LoadTest(args)
+    try:
+        elapsed = await test.run()
+    finally:
+        await main.vndb.close()
+    return test, elapsed
+
+
+def report(test, elapsed, upstream):
+    all_latencies = [value for values in test.latencies.values() for value in values]
+    interactions = len(all_latencies)
+    return {
+        "interactions": interactions,
+        "errors": test.errors,
+        "deferred": test.deferred,
+        "interactions_per_sec": interactions / elapsed,
+        "p50_ms": percentile(all_latencies, 0.50) * 1000,
+        "p99_ms": percentile(all_latencies, 0.99) * 1000,
+        "upstream_per_interaction": upstream / interactions,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "by_kind": {
+            kind: {"count": len(values), "p50_ms": percentile(values, 0.50) * 1000, "p99_ms": percentile(values, 0.99) * 1000}
+            for kind, values in sorted(test.latencies.items())
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the bot's command handlers against a local mock VNDB server")
+    parser.add_argument("--flows", type=int, default=2000, help="search-and-select flows (or /randomvn calls) to run")
+    parser.add_argument("--concurrency", type=int, default=50, help="flows running at the same time")
+    parser.add_argument("--queries", type=int, default=500, help="distinct search strings, fewer means more cache hits")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a search and its selection")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="seconds every reply to Discord takes")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean VNDB response time in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of VNDB requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of VNDB requests failing with a 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--empty-pool", action="store_true", help="leave the /randomvn pool empty to exercise the fallback")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="exit with an error when p99 latency is above this")
+    parser.add_argument("--min-rate", type=float, help="exit with an error when interactions/sec is below this")
+    args = parser.parse_args()
+
+    random.seed(0)
+    server, args.base_url = start_mock_server(args)
+    try:
+        test, elapsed = asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.wait()
+    result = report(test, elapsed, upstream_requests())
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"interactions          {result['interactions']} ({result['errors']} errors, {result['deferred']} deferred) in {elapsed:.1f}s")
+        print(f"throughput            {result['interactions_per_sec']:.1f} interactions/s")
+        print(f"latency               p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+        print(f"upstream requests     {result['upstream_per_interaction']:.2f} per interaction")
+        print(f"peak RSS              {result['peak_rss_mib']:.1f} MiB")
+        for kind, stats in result["by_kind"].items():
+            print(f"  {kind:<18} {stats['count']:6d}  p50 {stats['p50_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms")
+
+    failed = []
+    # A harness that cannot find the dropdown measures searches only, which must not pass silently
+    searches = [kind for kind in ("vn", "character", "cover") if kind in result["by_kind"]]
+    if searches and not any(f"{kind} select" in result["by_kind"] for kind in searches):
+        failed.append("no search was followed by a selection")
+    if args.max_p99_ms is not None and result["p99_ms"] > args.max_p99_ms:
+        failed.append(f"p99 {result['p99_ms']:.1f} ms is above {args.max_p99_ms} ms")
+    if args.min_rate is not None and result["interactions_per_sec"] < args.min_rate:
+        failed.append(f"{result['interactions_per_sec']:.1f} interactions/s is below {args.min_rate}")
+    if failed:
+        sys.exit("Regression: " + ", ".join(failed))
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+# Size of the fake catalogue, ids run from 1 to this for both VNs and characters
+CATALOGUE_SIZE = 5000
+SEARCH_RESULTS = 10
+
+LANGUAGES = ["ja", "en", "zh-Hans", "ko", "ru", "de"]
+PLATFORMS = ["win", "ps4", "swi", "and", "ios", "lin"]
+
+
+def fake_vn(number):
+    rng = random.Random(number)
+    return {
+        "id": f"v{number}",
+        "title": f"Visual Novel {number}",
+        "alttitle": f"ビジュアルノベル {number}",
+        "aliases": [f"VN{number}", f"Novel #{number}"],
+        "olang": "ja",
+        "titles": [{"title": f"Visual Novel {number}", "lang": "en"}, {"title": f"ビジュアルノベル {number}", "lang": "ja"}],
+        "description": f"[b]Visual Novel {number}[/b] follows [url=/c{number}]its heroine[/url] through a long summer.\n" * rng.randint(2, 12),
+        "relations": [{"id": f"v{rng.randint(1, CATALOGUE_SIZE)}", "relation": "seq", "title": f"Sequel of {number}"} for _ in range(rng.randint(0, 4))],
+        "platforms": rng.sample(PLATFORMS, rng.randint(1, 3)),
+        "image": {"url": f"https://t.vndb.org/cv/{number % 100:02d}/{number}.jpg", "sexual": 0, "violence": 0},
+        "length": rng.randint(1, 5),
+        "length_minutes": rng.randint(60, 6000),
+        "languages": rng.sample(LANGUAGES, rng.randint(1, 4)),
+    }
+
+
+def fake_character(number):
+    rng = random.Random(-number)
+    return {
+        "id": f"c{number}",
+        "name": f"Character {number}",
+        "original": f"キャラクター {number}",
+        "aliases": [f"Chara {number}"],
+        "description": f"A [i]character[/i] from [url=/v{number}]Visual Novel {number}[/url].",
+        "image": {"url": f"https://t.vndb.org/ch/{number % 100:02d}/{number}.jpg", "sexual": 0, "violence": 0},
+        "blood_type": rng.choice(["a", "b", "ab", "o", None]),
+        "height": rng.randint(140, 190),
+        "weight": rng.choice([None, rng.randint(40, 80)]),
+        "bust": None, "waist": None, "hips": None, "cup": None,
+        "age": rng.randint(14, 40),
+        "birthday": [rng.randint(1, 12), rng.randint(1, 28)],
+        "sex": [rng.choice(["m", "f"])],
+        "vns": [{"id": f"v{number}", "title": f"Visual Novel {number}", "role": "main"}],
+    }
+
+
+FAKES = {"vn": fake_vn, "character": fake_character}
+
+
+def ids_in(filters):
+    # Ids named by an ["id", "=", x] filter or an ["or", ...] of them, None for any other filter
+    if not filters:
+        return None
+    if filters[0] == "id" and filters[1] == "=":
+        return [filters[2]]
+    if filters[0] == "or" and all(f[0] == "id" and f[1] == "=" for f in filters[1:]):
+        return [f[2] for f in filters[1:]]
+    return None
+
+
+def answer(endpoint, body):
+    fake = FAKES[endpoint]
+    filters = body.get("filters")
+    results = body.get("results", SEARCH_RESULTS)
+
+    ids = ids_in(filters)
+    if ids is not None:
+        numbers = [int(i[1:]) for i in ids if 1 <= int(i[1:]) <= CATALOGUE_SIZE]
+        return {"results": [fake(n) for n in numbers], "more": False}
+
+    if filters and filters[0] == "search":
+        # Every query maps onto a stable slice of the catalogue
+        start = sum(map(ord, filters[2])) * 7 % (CATALOGUE_SIZE - results) + 1
+        return {"results": [fake(n) for n in range(start, start + results)], "more": False}
+
+    if filters and filters[0] == "id" and filters[1] == ">":
+        start = int(filters[2][1:]) + 1
+        numbers = range(start, min(CATALOGUE_SIZE, start + results - 1) + 1)
+        return {"results": [fake(n) for n in numbers], "more": start + results - 1 < CATALOGUE_SIZE}
+
+    numbers = range(CATALOGUE_SIZE, CATALOGUE_SIZE - results, -1) if body.get("reverse") else range(1, results + 1)
+    return {"results": [fake(n) for n in numbers], "more": True}
+
+
+def make_app(latency=0.05, jitter=0.5, error_rate=0.0, rate_limit_rate=0.0, retry_after=1):
+    app = web.Application()
+    app["requests"] = 0
+
+    async def handle(request):
+        app["requests"] += 1
+        endpoint = request.match_info["endpoint"]
+        if endpoint not in FAKES:
+            raise web.HTTPNotFound()
+        await asyncio.sleep(max(0.0, latency * random.uniform(1 - jitter, 1 + jitter)))
+
+        roll = random.random()
+        if roll < rate_limit_rate:
+            return web.Response(status=429, text="Throttled", headers={"Retry-After": str(retry_after)})
+        if roll < rate_limit_rate + error_rate:
+            return web.Response(status=500, text="Internal server error")
+        return web.json_response(answer(endpoint, await request.json()))
+
+    async def stats(request):
+        return web.json_response({"requests": app["requests"]})
+
+    app.router.add_post("/{endpoint}", handle)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the VNDB Kana API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="relative spread of the response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+    web.run_app(
+        make_app(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.retry_after),
+        host=args.host, port=args.port, access_log=None, print=None,
+    )
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a cached VNDB response stays fresh
+CACHE_TTL = float(os.getenv("VNDB_CACHE_TTL", "21600"))
+# Upper bound for the in-memory tier, in bytes of serialized JSON
+CACHE_MAX_BYTES = int(os.getenv("VNDB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Path of the optional on-disk tier, disabled when unset
+CACHE_PATH = os.getenv("VNDB_CACHE_PATH")
+# Most responses the on-disk tier keeps, the ones closest to expiring are dropped first
+CACHE_DISK_MAX_ROWS = int(os.getenv("VNDB_CACHE_DISK_MAX_ROWS", "200000"))
+# Seconds writes to the on-disk tier are collected before being committed together
+DISK_FLUSH_INTERVAL = 1.0
+# Seconds between purges of expired and excess rows, done along with a flush
+DISK_PURGE_INTERVAL = 600.0
+
+
+def _normalize_filters(filters):
+    if isinstance(filters, list):
+        if len(filters) == 3 and filters[0] == "search" and isinstance(filters[2], str):
+            return ["search", filters[1], " ".join(filters[2].casefold().split())]
+        return [_normalize_filters(f) for f in filters]
+    return filters
+
+
+def make_key(endpoint, filters=None, fields="", **params):
+    normalized_fields = ",".join(sorted({f.strip() for f in fields.split(",") if f.strip()}))
+    return json.dumps(
+        [endpoint, _normalize_filters(filters), normalized_fields, params],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+
+
+class CacheStats:
+    __slots__ = ("hits", "disk_hits", "misses", "evictions", "expirations")
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Reads stay on the event loop, they are single primary key lookups. Writes are buffered and
+# committed in one transaction on a worker thread, through a second connection that WAL lets
+# write while the first one reads.
+class DiskCache:
+    def __init__(self, path, flush_interval=DISK_FLUSH_INTERVAL, max_rows=CACHE_DISK_MAX_ROWS):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+        self._conn.commit()
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._write_lock = threading.Lock()
+        # key -> (value, expires), or None for a delete, not written yet and being written
+        self._pending = {}
+        self._writing = {}
+        self._flush_task = None
+        # Purged on the first flush, entries from before a restart may have expired long ago
+        self._purged_at = 0.0
+
+    def get(self, key, now):
+        if key in self._pending:
+            row = self._pending[key]
+        elif key in self._writing:
+            row = self._writing[key]
+        else:
+            row = self._conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            self.delete(key)
+            return None
+        return row[0], row[1]
+
+    def set(self, key, value, expires):
+        self._pending[key] = (value, expires)
+        self._schedule_flush()
+
+    def delete(self, key):
+        self._pending[key] = None
+        self._schedule_flush()
+
+    def purge_expired(self, now=None):
+        self.flush()
+        with self._write_lock, self._writer:
+            self._purge(now or time.time())
+
+    def _purge(self, now):
+        # Called with the write lock held, inside a transaction
+        self._purged_at = now
+        self._writer.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        self._writer.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY expires LIMIT max(0, (SELECT count(*) FROM responses) - ?))",
+            (self.max_rows,),
+        )
+
+    def _schedule_flush(self):
+        if self._flush_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the bot, e.g. in scripts, there is no loop to block
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        self._writing, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, self._writing)
+        except sqlite3.Error as e:
+            print(f"Failed to write {len(self._writing)} entries to the disk cache: {e}")
+        finally:
+            self._writing = {}
+
+    def flush(self):
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                [(key, *entry) for key, entry in batch.items() if entry is not None],
+            )
+            self._writer.executemany(
+                "DELETE FROM responses WHERE key = ?", [(key,) for key, entry in batch.items() if entry is None],
+            )
+            now = time.time()
+            if now - self._purged_at >= DISK_PURGE_INTERVAL:
+                self._purge(now)
+
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        # Whatever is still buffered is written before closing, the bot is shutting down anyway
+        self.flush()
+        # A write still running on a worker thread holds the lock until it committed
+        with self._write_lock:
+            self._writer.close()
+        self._conn.close()
+
+
+# In-memory LRU bounded in bytes, backed by the optional SQLite tier
+class ResponseCache:
+    def __init__(self, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, path=CACHE_PATH):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stats = CacheStats()
+        # key -> (value, expires, size)
+        self._entries = OrderedDict()
+        self._disk = DiskCache(path) if path else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[0]
+            self._remove(key)
+            self.stats.expirations += 1
+
+        if self._disk is not None:
+            stored = self._disk.get(key, now)
+            if stored is not None:
+                value = json.loads(stored[0])
+                self._store(key, value, stored[1], len(stored[0]))
+                self.stats.disk_hits += 1
+                return value
+
+        self.stats.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        serialized = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+        self._store(key, value, expires, len(serialized))
+        if self._disk is not None:
+            self._disk.set(key, serialized, expires)
+
+    def invalidate(self, key):
+        self._remove(key)
+        if self._disk is not None:
+            self._disk.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _store(self, key, value, expires, size):
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, expires, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.stats.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
@@ -0,0 +1,377 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Path of the SQLite index built from the VNDB database dumps, disabled when unset
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH")
+
+IMPORT_BATCH_SIZE = 1000
+# API fields of the entries crawled into the index after the dump
+CATCH_UP_FIELDS = {
+    "vn": "id,title,alttitle,aliases,olang,titles.title,titles.latin,image.id,image.sexual,image.violence,votecount,length,languages,platforms",
+    "character": "id,name,original,aliases,sex,image.id,image.sexual,image.violence",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS vn (
+    id TEXT PRIMARY KEY, title TEXT, alttitle TEXT, olang TEXT, aliases TEXT, image TEXT, votes INTEGER,
+    length INTEGER, languages TEXT, platforms TEXT
+);
+CREATE TABLE IF NOT EXISTS chars (
+    id TEXT PRIMARY KEY, name TEXT, original TEXT, aliases TEXT, sex TEXT, image TEXT
+);
+CREATE TABLE IF NOT EXISTS images (id TEXT PRIMARY KEY, sexual REAL, violence REAL);
+CREATE VIRTUAL TABLE IF NOT EXISTS vn_fts USING fts5(names, tokenize='unicode61 remove_diacritics 2');
+CREATE VIRTUAL TABLE IF NOT EXISTS chars_fts USING fts5(names, tokenize='unicode61 remove_diacritics 2');
+"""
+
+# Columns added after the first index format, added to existing indexes on open
+VN_ATTRIBUTE_COLUMNS = (("length", "INTEGER"), ("languages", "TEXT"), ("platforms", "TEXT"))
+
+_COPY_ESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+
+def _unescape(value):
+    # Dumps use PostgreSQL COPY text format
+    if value == '\\N':
+        return None
+    if '\\' not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for c in chars:
+        if c == '\\':
+            nxt = next(chars, '')
+            out.append(_COPY_ESCAPES.get(nxt, nxt))
+        else:
+            out.append(c)
+    return ''.join(out)
+
+
+def read_table(dump_dir, table):
+    with open(os.path.join(dump_dir, "db", f"{table}.header"), encoding="utf-8") as f:
+        columns = f.readline().rstrip('\n').split('\t')
+
+    # Streamed line by line so the dumps never have to fit in memory
+    with open(os.path.join(dump_dir, "db", table), encoding="utf-8") as f:
+        for line in f:
+            yield dict(zip(columns, (_unescape(v) for v in line.rstrip('\n').split('\t'))))
+
+
+def has_table(dump_dir, table):
+    return os.path.exists(os.path.join(dump_dir, "db", f"{table}.header"))
+
+
+def _array(value):
+    # PostgreSQL array text format, e.g. {en,ja}
+    return [v.strip('"') for v in value.strip('{}').split(',') if v] if value else []
+
+
+def image_url(image_id):
+    if not image_id:
+        return None
+    prefix, number = image_id[:2], int(image_id[2:])
+    return f"https://t.vndb.org/{prefix}/{number % 100:02d}/{number}.jpg"
+
+
+def _fts_query(text):
+    tokens = text.replace('"', ' ').split()
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _flag_average(value):
+    return int(value) / 100 if value is not None else None
+
+
+def _batched(rows, size=IMPORT_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class LocalIndex:
+    def __init__(self, path=LOCAL_INDEX_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        # WAL lets the bot keep searching while entries newer than the dump are written in the background
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(vn)")}
+        for column, kind in VN_ATTRIBUTE_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE vn ADD COLUMN {column} {kind}")
+        self._conn.commit()
+        self._writer = None
+        self._write_lock = threading.Lock()
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+        self._conn.close()
+
+    def meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def max_id(self, endpoint):
+        # Highest id the index knows, anything above it is only known to the API
+        return int(self.meta("max_vn_id" if endpoint == "vn" else "max_char_id") or 0)
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def import_dump(self, dump_dir, force=False):
+        timestamp_file = os.path.join(dump_dir, "TIMESTAMP")
+        dump_timestamp = open(timestamp_file).read().strip() if os.path.exists(timestamp_file) else None
+        if not force and dump_timestamp is not None and dump_timestamp == self.meta("dump_timestamp"):
+            return False
+
+        with self._conn:
+            self._import_images(dump_dir)
+            self._import_vns(dump_dir)
+            self._import_vn_releases(dump_dir)
+            self._import_chars(dump_dir)
+            self._set_meta("dump_timestamp", dump_timestamp or "")
+            self._set_meta("imported_at", time.time())
+            self._set_meta("max_vn_id", self._max_id("vn"))
+            self._set_meta("max_char_id", self._max_id("chars"))
+        self._conn.execute("INSERT INTO vn_fts(vn_fts) VALUES ('optimize')")
+        self._conn.execute("INSERT INTO chars_fts(chars_fts) VALUES ('optimize')")
+        self._conn.commit()
+        return True
+
+    def _max_id(self, table):
+        row = self._conn.execute(f"SELECT max(CAST(substr(id, 2) AS INTEGER)) FROM {table}").fetchone()
+        return row[0] or 0
+
+    def _import_images(self, dump_dir):
+        for batch in _batched(read_table(dump_dir, "images")):
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?)",
+                # The dump keeps the flag averages times 100, the API (and the rest of the bot) uses 0 - 2
+                [(r['id'], _flag_average(r.get('c_sexual_avg')), _flag_average(r.get('c_violence_avg'))) for r in batch],
+            )
+
+    def _import_vns(self, dump_dir):
+        olangs = {}
+        for batch in _batched(read_table(dump_dir, "vn")):
+            rows = []
+            for r in batch:
+                olangs[r['id']] = r.get('olang')
+                rows.append((
+                    r['id'], r.get('olang'), r.get('alias') or '', r.get('image'), int(r.get('c_votecount') or 0),
+                    int(r.get('length') or 0) or None,
+                    ','.join(_array(r.get('c_languages'))), ','.join(_array(r.get('c_platforms'))),
+                ))
+            self._conn.executemany(
+                "INSERT INTO vn (id, olang, aliases, image, votes, length, languages, platforms) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET olang = excluded.olang, aliases = excluded.aliases, "
+                "image = excluded.image, votes = excluded.votes, length = excluded.length, "
+                "languages = excluded.languages, platforms = excluded.platforms",
+                rows,
+            )
+
+        # Titles are grouped per VN, collect them to pick the main title and feed the search index
+        names = {}
+        updates = []
+        for r in read_table(dump_dir, "vn_titles"):
+            vn_id = r['id']
+            if vn_id not in names and len(names) >= IMPORT_BATCH_SIZE:
+                self._conn.executemany("UPDATE vn SET title = ?, alttitle = ? WHERE id = ?", updates)
+                self._index_names("vn_fts", "vn", names)
+                names, updates = {}, []
+
+            names.setdefault(vn_id, []).extend(t for t in (r.get('title'), r.get('latin')) if t)
+            if r.get('lang') == olangs.get(vn_id):
+                latin = r.get('latin')
+                updates.append((latin or r['title'], r['title'] if latin else None, vn_id))
+        self._conn.executemany("UPDATE vn SET title = ?, alttitle = ? WHERE id = ?", updates)
+        self._index_names("vn_fts", "vn", names)
+
+    def _import_vn_releases(self, dump_dir):
+        # Dumps without the cached language and platform columns on vn get them from the releases
+        if not has_table(dump_dir, "releases_vn"):
+            return
+        release_vns = {}
+        for r in read_table(dump_dir, "releases_vn"):
+            release_vns.setdefault(r['id'], []).append(r['vid'])
+
+        attributes = {}
+        for table, column, slot in (("releases_titles", "lang", 0), ("releases_lang", "lang", 0), ("releases_platforms", "platform", 1)):
+            if not has_table(dump_dir, table):
+                continue
+            for r in read_table(dump_dir, table):
+                for vn_id in release_vns.get(r['id'], ()):
+                    attributes.setdefault(vn_id, (set(), set()))[slot].add(r[column])
+
+        for batch in _batched(attributes.items()):
+            self._conn.executemany(
+                "UPDATE vn SET languages = coalesce(nullif(languages, ''), ?), platforms = coalesce(nullif(platforms, ''), ?) WHERE id = ?",
+                [(','.join(sorted(languages)), ','.join(sorted(platforms)), vn_id) for vn_id, (languages, platforms) in batch],
+            )
+
+    def iter_vn_attributes(self, after=0):
+        # (id, languages, length, platforms) in id order, for seeding the /randomvn pool.
+        # Indexes imported before these columns existed yield nothing.
+        rows = self._conn.execute(
+            "SELECT id, languages, length, platforms FROM vn WHERE languages IS NOT NULL AND CAST(substr(id, 2) AS INTEGER) > ? "
+            "ORDER BY CAST(substr(id, 2) AS INTEGER)",
+            (after,),
+        )
+        for vn_id, languages, length, platforms in rows:
+            yield vn_id, [l for l in languages.split(',') if l], length, [p for p in (platforms or '').split(',') if p]
+
+    def _import_chars(self, dump_dir):
+        for batch in _batched(read_table(dump_dir, "chars")):
+            rows = []
+            for r in batch:
+                # Newer dumps split the name into name (original script) and latin
+                if 'latin' in r:
+                    name, original = (r['latin'], r['name']) if r.get('latin') else (r.get('name'), None)
+                else:
+                    name, original = r.get('name'), r.get('original')
+                rows.append((r['id'], name, original, r.get('alias') or '', r.get('gender'), r.get('image')))
+            self._conn.executemany("INSERT OR REPLACE INTO chars VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._index_names("chars_fts", "chars", {
+                row[0]: [n for n in (row[1], row[2], row[3]) if n] for row in rows
+            })
+
+    def add_entries(self, endpoint, results):
+        # Writes entries crawled from the API (with CATCH_UP_FIELDS) and moves max_id past them.
+        # Blocking, run it on a worker thread, it uses its own connection.
+        if not results:
+            return
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.path, check_same_thread=False)
+            conn = self._writer
+            with conn:
+                images = [
+                    (r['image']['id'], r['image'].get('sexual'), r['image'].get('violence'))
+                    for r in results if (r.get('image') or {}).get('id')
+                ]
+                conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?)", images)
+                if endpoint == "vn":
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO vn (id, title, alttitle, olang, aliases, image, votes, length, languages, platforms) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(
+                            r['id'], r.get('title'), r.get('alttitle'), r.get('olang'), '\n'.join(r.get('aliases') or ()),
+                            (r.get('image') or {}).get('id'), r.get('votecount') or 0, r.get('length'),
+                            ','.join(r.get('languages') or ()), ','.join(r.get('platforms') or ()),
+                        ) for r in results],
+                    )
+                    self._index_names("vn_fts", "vn", {
+                        r['id']: [n for t in r.get('titles') or () for n in (t.get('title'), t.get('latin')) if n] or [r.get('title') or '']
+                        for r in results
+                    }, conn)
+                    meta_key = "max_vn_id"
+                else:
+                    rows = [(
+                        r['id'], r.get('name'), r.get('original'), '\n'.join(r.get('aliases') or ()),
+                        (r.get('sex') or [None])[0], (r.get('image') or {}).get('id'),
+                    ) for r in results]
+                    conn.executemany("INSERT OR REPLACE INTO chars VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    self._index_names("chars_fts", "chars", {row[0]: [n for n in (row[1], row[2], row[3]) if n] for row in rows}, conn)
+                    meta_key = "max_char_id"
+                newest = max(int(r['id'][1:]) for r in results)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES (?, max(?, coalesce((SELECT CAST(value AS INTEGER) FROM meta WHERE key = ?), 0)))",
+                    (meta_key, newest, meta_key),
+                )
+
+    def _index_names(self, fts_table, table, names, conn=None):
+        if not names:
+            return
+        conn = conn or self._conn
+        ids = list(names)
+        # The FTS rowid is the numeric part of the VNDB id
+        conn.executemany(f"DELETE FROM {fts_table} WHERE rowid = ?", [(int(i[1:]),) for i in ids])
+        aliases = dict(conn.execute(
+            f"SELECT id, aliases FROM {table} WHERE id IN ({','.join('?' * len(ids))})", ids
+        )) if table == "vn" else {}
+        conn.executemany(
+            f"INSERT INTO {fts_table} (rowid, names) VALUES (?, ?)",
+            [(int(i[1:]), '\n'.join([*n, aliases.get(i) or ''])) for i, n in names.items()],
+        )
+
+    def search_vns(self, name, limit=10, offset=0):
+        query = _fts_query(name)
+        if not query:
+            return []
+        rows = self._conn.execute(
+            "SELECT vn.id, vn.title, vn.alttitle, vn.olang, vn.aliases, vn.image, images.sexual, images.violence "
+            "FROM vn_fts JOIN vn ON vn.id = 'v' || vn_fts.rowid LEFT JOIN images ON images.id = vn.image "
+            "WHERE vn_fts MATCH ? ORDER BY bm25(vn_fts), vn.votes DESC LIMIT ? OFFSET ?",
+            (query, limit, offset),
+        ).fetchall()
+        return [
+            {
+                "id": vn_id,
+                "title": title or alttitle or vn_id,
+                "alttitle": alttitle,
+                "olang": olang,
+                "aliases": [a for a in (aliases or '').split('\n') if a],
+                "image": {"url": image_url(image), "sexual": sexual, "violence": violence} if image else None,
+            }
+            for vn_id, title, alttitle, olang, aliases, image, sexual, violence in rows
+        ]
+
+    def search_characters(self, name, limit=10, offset=0):
+        query = _fts_query(name)
+        if not query:
+            return []
+        rows = self._conn.execute(
+            "SELECT chars.id, chars.name, chars.original, chars.aliases, chars.sex "
+            "FROM chars_fts JOIN chars ON chars.id = 'c' || chars_fts.rowid "
+            "WHERE chars_fts MATCH ? ORDER BY bm25(chars_fts) LIMIT ? OFFSET ?",
+            (query, limit, offset),
+        ).fetchall()
+        return [
+            {
+                "id": char_id,
+                "name": name,
+                "original": original,
+                "aliases": [a for a in (aliases or '').split('\n') if a],
+                "sex": [sex] if sex else [],
+            }
+            for char_id, name, original, aliases, sex in rows
+        ]
+
+    def iter_titles(self, endpoint):
+        if endpoint == "vn":
+            rows = self._conn.execute("SELECT id, title, alttitle, aliases FROM vn WHERE title IS NOT NULL")
+        else:
+            rows = self._conn.execute("SELECT id, name, original, aliases FROM chars WHERE name IS NOT NULL")
+        for item_id, label, original, aliases in rows:
+            yield item_id, label, [n for n in (original, *(aliases or '').split('\n')) if n]
+
+    def search(self, endpoint, name, limit=10, offset=0):
+        if endpoint == "vn":
+            return self.search_vns(name, limit, offset)
+        if endpoint == "character":
+            return self.search_characters(name, limit, offset)
+        return []
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not LOCAL_INDEX_PATH:
+        print("Usage: LOCAL_INDEX_PATH=index.db python dump_index.py <extracted dump directory> [--force]")
+        sys.exit(1)
+
+    index = LocalIndex()
+    started = time.perf_counter()
+    if index.import_dump(sys.argv[1], force="--force" in sys.argv):
+        print(f"Imported dump in {time.perf_counter() - started:.1f}s")
+    else:
+        print("Index is already up to date with this dump")
+    index.close()
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+
+import discord
+
+from formatting import truncate_text
+from languages import LANGUAGE_TO_FLAG
+
+EMBED_COLOR = 0x757e8a
+
+# Built embed payloads kept per (id, layout)
+EMBED_CACHE_SIZE = 2048
+# Entries per page of a /vncompare or /vnseries embed
+COLLECTION_PAGE_SIZE = 5
+
+SEX_LABELS = {'m': '♂️ Male', 'f': '♀️ Female'}
+
+
+def _vn_full(vn):
+    embed = discord.Embed(
+        title=vn.title,
+        url=f"https://vndb.org/{vn.id}",
+        description=vn.description,
+        color=EMBED_COLOR
+    )
+    if vn.cover:
+        embed.set_thumbnail(url=vn.cover)
+    embed.add_field(name="🏷️ __Original Name:__", value=truncate_text(vn.original_title), inline=False)
+    embed.add_field(name="🔄 __Alternate Names:__", value=truncate_text(", ".join(vn.alternate_names) or "N/A"), inline=False)
+    embed.add_field(name="⏳ __Playtime:__", value=truncate_text(vn.length), inline=False)
+    embed.add_field(name="🌐 __Languages:__", value=truncate_text(" ".join(LANGUAGE_TO_FLAG.get(lang, '🏳️') for lang in vn.languages) or "N/A"), inline=False)
+    embed.add_field(name="🎮 __Platforms:__", value=truncate_text(", ".join(vn.platforms) or "N/A"), inline=False)
+    embed.add_field(name="🔗 __Related Media:__", value=truncate_text(vn.related_vns), inline=False)
+    return embed
+
+
+def _vn_cover(vn):
+    embed = discord.Embed(
+        title=vn.title,
+        url=f"https://vndb.org/{vn.id}",
+        color=EMBED_COLOR
+    )
+    if vn.cover:
+        embed.set_image(url=vn.cover)
+    return embed
+
+
+def _character_full(char):
+    measurements = (
+        f"- **Height:**\n - {char.height} cm\n"
+        f"- **Weight:**\n - {char.weight or 'N/A'} kg\n"
+        f"- **Bust - Waist - Hips:** \n - {char.bust or 'N/A'} cm\n - {char.waist or 'N/A'} cm\n - {char.hips or 'N/A'} cm\n"
+        f"- **Cup:**\n - {char.cup or 'N/A'}"
+    ) if char.height else "N/A"
+    birthday = ", ".join(map(str, char.birthday)) if char.birthday else "N/A"
+    sex = ", ".join(SEX_LABELS.get(s, '⚪ Not Specified') for s in dict.fromkeys(char.sex)) or "N/A"
+    roles = "\n".join(f"[{title}](https://vndb.org/{vn_id}) ({role})" for vn_id, title, role in char.vns) or "N/A"
+
+    embed = discord.Embed(
+        title=char.name,
+        url=f"https://vndb.org/{char.id}",
+        description=char.description,
+        color=EMBED_COLOR
+    )
+    if char.image_url:
+        embed.set_thumbnail(url=char.image_url)
+    embed.add_field(name="🏷️ __Original Name:__", value=truncate_text(char.original_name), inline=False)
+    embed.add_field(name="🔄 __Aliases:__", value=truncate_text(", ".join(char.aliases) or "N/A"), inline=False)
+    embed.add_field(name="📏 __Measurements:__", value=measurements, inline=False)
+    embed.add_field(name="🎂 __Birthday (Month, Day):__", value=birthday, inline=False)
+    embed.add_field(name="🩸 __Blood Type:__", value=char.blood_type or "N/A", inline=False)
+    embed.add_field(name="♂️ __Gender:__", value=sex, inline=False)
+    embed.add_field(name="🎭 __Roles:__", value=truncate_text(roles), inline=False)
+    return embed
+
+
+LAYOUTS = {
+    "vn": _vn_full,
+    "cover": _vn_cover,
+    "character": _character_full,
+}
+
+
+def _from_payload(payload):
+    # The field list is the only part Embed mutates in place, so that is all that needs copying
+    return discord.Embed.from_dict({**payload, "fields": list(payload.get("fields", ()))})
+
+
+class EmbedCache:
+    def __init__(self, size=EMBED_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        # (id, layout) -> (record, embed payload dict)
+        self._entries = OrderedDict()
+
+    def build(self, record, layout):
+        key = (record.id, layout)
+        entry = self._entries.get(key)
+        # A refetched record that changed upstream must not reuse the old payload
+        if entry is not None and entry[0] == record:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _from_payload(entry[1])
+
+        self.misses += 1
+        payload = LAYOUTS[layout](record).to_dict()
+        self._entries[key] = (record, payload)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return _from_payload(payload)
+
+
+embed_cache = EmbedCache()
+
+
+def build_embed(record, layout):
+    return embed_cache.build(record, layout)
+
+
+def _collection_entry(vn, note):
+    stats = [
+        vn.released or "TBA",
+        f"⭐ {vn.rating / 10:.2f}" if vn.rating else None,
+        f"⏳ {vn.length}" if vn.length != "N/A" else None,
+        " ".join(LANGUAGE_TO_FLAG.get(lang, '🏳️') for lang in vn.languages) or None,
+        ", ".join(vn.platforms) or None,
+    ]
+    lines = [f"[{vn.id}](https://vndb.org/{vn.id}) · " + " · ".join(s for s in stats if s)]
+    if note:
+        lines.append(f"*{note}*")
+    return truncate_text("\n".join(lines))
+
+
+def build_collection_embed(title, entries, page, page_size=COLLECTION_PAGE_SIZE):
+    # entries: [(VNDetails, note or None)]. Returns the embed for one page and whether more pages follow.
+    pages = max(1, -(-len(entries) // page_size))
+    page = min(max(1, page), pages)
+    embed = discord.Embed(title=title, color=EMBED_COLOR)
+    shown = entries[(page - 1) * page_size:page * page_size]
+    for vn, note in shown:
+        embed.add_field(name=truncate_text(vn.title, 256), value=_collection_entry(vn, note), inline=False)
+    embed.set_footer(text=f"Page {page} of {pages} · {len(entries)} visual novels")
+    return embed, page < pages
@@ -0,0 +1,179 @@
+import re
+from functools import lru_cache
+
+# Discord embed limits
+DESCRIPTION_LIMIT = 4096
+FIELD_LIMIT = 1024
+
+ELLIPSIS = "..."
+
+# One pattern for every tag. url, raw and code blocks are matched together with their content up to the
+# closing tag or the end of the text, so the tokenizer never searches twice, and so are formatting tags
+# around plain text, the most common case, which saves two trips through the tokenizer loop.
+_TOKEN = re.compile(
+    r'\[url(?:=([^\]]*))?\](.*?)(?:\[/url\]|\Z)'
+    r'|\[(raw|code)(?:=[^\]]*)?\](.*?)(?:\[/\3\]|\Z)'
+    r'|\[(spoiler|b|i|u|s)\]([^\[]+)\[/\5\]'
+    r'|\[(/?)(spoiler|quote|url|raw|code|b|i|u|s)(?:=[^\]]*)?\]',
+    re.IGNORECASE | re.DOTALL,
+)
+_MARKDOWN_LINK = re.compile(r'\[[^\]\n]*\]\([^)\s]*\)')
+
+# tag -> (opening markdown, closing markdown)
+_MARKERS = {
+    "b": ("**", "**"),
+    "i": ("*", "*"),
+    "u": ("__", "__"),
+    "s": ("~~", "~~"),
+    "spoiler": ("||", "||"),
+    "quote": ("\n> ", "\n"),
+}
+
+# Token kinds produced by the tokenizer
+_TEXT, _ATOM, _OPEN, _CLOSE = range(4)
+
+
+def _link_target(target):
+    target = target.strip()
+    return f"https://vndb.org{target}" if target.startswith('/') else target
+
+
+def _tokenize(text, limit=None):
+    # Single pass over the BBCode producing text (splittable), atoms (never split) and formatting markers.
+    # With a limit, stops once the rendered text is known to exceed it, the rest would only be truncated away.
+    tokens = []
+    append = tokens.append
+    stack = []
+    quote_depth = 0
+    pos = 0
+    size = 0
+
+    for match in _TOKEN.finditer(text):
+        start = match.start()
+        if start > pos:
+            chunk = text[pos:start]
+            if quote_depth:
+                chunk = chunk.replace('\n', '\n> ')
+            append((_TEXT, chunk))
+            size += len(chunk)
+        pos = match.end()
+        target, label, block, inner, pair, content, closing, tag = match.groups()
+
+        if pair is not None:
+            marker = _MARKERS[pair.lower()]
+            if quote_depth:
+                content = content.replace('\n', '\n> ')
+            tokens += ((_OPEN, *marker), (_TEXT, content), (_CLOSE, marker[1]))
+            size += len(content)
+        elif tag is None:
+            if block is None:
+                if target:
+                    label = _render(_tokenize(label)) if '[' in label else label.strip()
+                    token = (_ATOM, f"[{label or target}]({_link_target(target)})")
+                else:
+                    token = (_TEXT, label.replace('\n', '\n> ') if quote_depth else label)
+            elif block.lower() == "code":
+                token = (_ATOM, f"\n```\n{inner.strip(chr(10))}\n```\n")
+            else:
+                token = (_TEXT, inner.replace('\n', '\n> ') if quote_depth else inner)
+            if token[1]:
+                append(token)
+                size += len(token[1])
+        elif closing:
+            tag = tag.lower()
+            if tag in stack:
+                while stack:
+                    open_tag = stack.pop()
+                    if open_tag == "quote":
+                        quote_depth -= 1
+                    # An empty pair leaves nothing behind instead of a bare marker like ****
+                    if tokens[-1][0] == _OPEN:
+                        tokens.pop()
+                    else:
+                        append((_CLOSE, _MARKERS[open_tag][1]))
+                    if open_tag == tag:
+                        break
+            continue
+        else:
+            tag = tag.lower()
+            if tag in _MARKERS:
+                stack.append(tag)
+                if tag == "quote":
+                    quote_depth += 1
+                append((_OPEN, *_MARKERS[tag]))
+            continue
+
+        if limit is not None and size > limit and len(_render(tokens)) > limit:
+            return tokens
+
+    if pos < len(text):
+        chunk = text[pos:]
+        append((_TEXT, chunk.replace('\n', '\n> ') if quote_depth else chunk))
+    for open_tag in reversed(stack):
+        if tokens[-1][0] == _OPEN:
+            tokens.pop()
+        else:
+            append((_CLOSE, _MARKERS[open_tag][1]))
+    return tokens
+
+
+def _render(tokens):
+    return "".join([token[1] for token in tokens]).strip()
+
+
+def _truncate(tokens, limit):
+    out = []
+    closers = []
+    # Room left for content once the ellipsis and the closing markers are accounted for
+    budget = limit - len(ELLIPSIS)
+    for token in tokens:
+        kind = token[0]
+        value = token[1]
+        if kind == _OPEN:
+            closer = token[2]
+            if len(value) + len(closer) > budget:
+                break
+            closers.append(closer)
+            budget -= len(closer)
+        elif kind == _CLOSE:
+            closers.pop()
+            budget += len(value)
+        elif len(value) > budget:
+            if kind == _TEXT:
+                cut = value.rfind(' ', 0, budget)
+                out.append(value[:cut if cut > budget // 2 else budget].rstrip())
+            break
+        out.append(value)
+        budget -= len(value)
+    out.append(ELLIPSIS)
+    out.extend(reversed(closers))
+    return "".join(out).strip()
+
+
+@lru_cache(maxsize=4096)
+def format_description(description, limit=DESCRIPTION_LIMIT):
+    if description is None:
+        return "N/A"
+
+    tokens = _tokenize(description, limit) if '[' in description else [(_TEXT, description)]
+    formatted = _render(tokens)
+    if len(formatted) <= limit:
+        return formatted
+    return _truncate(tokens, limit)
+
+
+def truncate_text(text, limit=FIELD_LIMIT):
+    if text is None:
+        return "N/A"
+    if len(text) <= limit:
+        return text
+
+    cut = limit - len(ELLIPSIS)
+    # Never cut through a Markdown link, drop it whole instead
+    for link in _MARKDOWN_LINK.finditer(text):
+        if link.start() >= cut:
+            break
+        if link.end() > cut:
+            cut = link.start()
+            break
+    return text[:cut].rstrip(", ") + ELLIPSIS
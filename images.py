@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import aiohttp
+import discord
+
+from vndb import SingleFlight
+
+try:
+    from PIL import Image, ImageFilter
+except ImportError:
+    # Without Pillow covers are still cached, but only ever sent at their original size
+    Image = None
+
+# Directory of the local image cache, images are hotlinked from VNDB when unset
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# VNDB rates images from 0 (safe, tame) to 2 (explicit, brutal), covers rated above this are
+# blurred or left out outside NSFW channels
+IMAGE_FLAG_LIMIT = float(os.getenv("IMAGE_FLAG_LIMIT", "1"))
+
+THUMBNAIL_SIZE = 256
+BLUR_RADIUS = 12
+DOWNLOAD_TIMEOUT = 10
+DOWNLOAD_MAX_BYTES = 8 * 1024 * 1024
+EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+
+def is_flagged(sexual, violence, limit=IMAGE_FLAG_LIMIT):
+    return (sexual or 0) > limit or (violence or 0) > limit
+
+
+def is_nsfw_channel(interaction):
+    is_nsfw = getattr(interaction.channel, "is_nsfw", None)
+    return bool(is_nsfw and is_nsfw())
+
+
+def _render(source, target, variant):
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE) if variant == "thumb" else (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+        if variant == "blurred":
+            image = image.filter(ImageFilter.GaussianBlur(BLUR_RADIUS))
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        image.save(tmp_path, "JPEG", quality=85, optimize=True)
+    os.replace(tmp_path, target)
+
+
+# Content-addressed: originals are stored under the SHA-256 of their bytes and variants next to
+# them, so covers shared by several entries are downloaded and resized once
+class ImageStore:
+    def __init__(self, path=IMAGE_CACHE_PATH, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.can_render = Image is not None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        os.makedirs(path, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, "sources.db"))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sources (url TEXT PRIMARY KEY, name TEXT NOT NULL)")
+        self._db.commit()
+        # Downloads are stored on a worker thread, through their own connection
+        self._writer = sqlite3.connect(os.path.join(path, "sources.db"), check_same_thread=False)
+        self._write_lock = threading.Lock()
+        # file name -> size, least recently used first
+        self._files = OrderedDict()
+        entries = [e for e in os.scandir(path) if e.is_file() and os.path.splitext(e.name)[1] in EXTENSIONS]
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            self._files[entry.name] = entry.stat().st_size
+            self.size += entry.stat().st_size
+        self.inflight = SingleFlight()
+        self._session = None
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        with self._write_lock:
+            self._writer.close()
+        self._db.close()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "files": len(self._files), "bytes": self.size}
+
+    async def get(self, url, variant="original"):
+        # Path of the cached image in the given variant, or None when it could not be downloaded
+        source = self._source(url)
+        name = source if source is None or variant == "original" else f"{os.path.splitext(source)[0]}-{variant}.jpg"
+        if name is not None and self._touch(name):
+            self.hits += 1
+            return os.path.join(self.path, name)
+        self.misses += 1
+        return await self.inflight.run((url, variant), lambda: self._fetch(url, variant))
+
+    async def _fetch(self, url, variant):
+        source = self._source(url)
+        if source is None or not self._touch(source):
+            source = await self._download(url)
+            if source is None:
+                return None
+        if variant == "original":
+            return os.path.join(self.path, source)
+
+        name = f"{os.path.splitext(source)[0]}-{variant}.jpg"
+        try:
+            await asyncio.to_thread(_render, os.path.join(self.path, source), os.path.join(self.path, name), variant)
+        except (OSError, ValueError) as e:
+            print(f"Failed to make a {variant} variant of {url}: {e}")
+            return None
+        self._add(name)
+        return os.path.join(self.path, name)
+
+    async def _download(self, url):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT))
+        try:
+            async with self._session.get(url) as response:
+                if response.status != 200 or not response.content_type.startswith("image/"):
+                    return None
+                if (response.content_length or 0) > DOWNLOAD_MAX_BYTES:
+                    return None
+                data = await response.content.read(DOWNLOAD_MAX_BYTES + 1)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to download {url}: {e}")
+            return None
+        if len(data) > DOWNLOAD_MAX_BYTES:
+            return None
+
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        name = hashlib.sha256(data).hexdigest() + (extension if extension in EXTENSIONS else ".jpg")
+        new = not self._touch(name)
+        try:
+            await asyncio.to_thread(self._store, url, name, data if new else None)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Failed to store {url}: {e}")
+            return None
+        if new:
+            self._add(name)
+        return name
+
+    def _store(self, url, name, data):
+        # Blocking, runs on a worker thread. data is None when the file is already cached.
+        if data is not None:
+            tmp_path = os.path.join(self.path, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.path, name))
+        with self._write_lock, self._writer:
+            self._writer.execute("INSERT OR REPLACE INTO sources (url, name) VALUES (?, ?)", (url, name))
+
+    def _source(self, url):
+        row = self._db.execute("SELECT name FROM sources WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def _touch(self, name):
+        if name not in self._files:
+            return False
+        try:
+            os.utime(os.path.join(self.path, name))
+        except FileNotFoundError:
+            # Evicted by another worker sharing the directory
+            self.size -= self._files.pop(name)
+            return False
+        self._files.move_to_end(name)
+        return True
+
+    def _add(self, name):
+        size = os.path.getsize(os.path.join(self.path, name))
+        self.size += size - self._files.pop(name, 0)
+        self._files[name] = size
+        while self.size > self.max_bytes and len(self._files) > 1:
+            evicted, evicted_size = self._files.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.path, evicted))
+            except FileNotFoundError:
+                pass
+
+
+def _set(embed, slot, url):
+    if slot == "thumbnail":
+        embed.set_thumbnail(url=url)
+    else:
+        embed.set_image(url=url)
+
+
+async def attach_image(store, embed, slot, url, sexual=None, violence=None, nsfw=False):
+    # Points the embed's thumbnail or image at a cached copy and returns the file to send with it.
+    # Returns None when the image is hotlinked instead, or left out.
+    flagged = not nsfw and is_flagged(sexual, violence)
+    if not url or (flagged and (store is None or not store.can_render)):
+        _set(embed, slot, None)
+        return None
+    if store is None:
+        _set(embed, slot, url)
+        return None
+
+    variant = "blurred" if flagged else "thumb" if slot == "thumbnail" and store.can_render else "original"
+    path = await store.get(url, variant)
+    if path is None:
+        _set(embed, slot, None if flagged else url)
+        return None
+    filename = f"{slot}{os.path.splitext(path)[1]}"
+    _set(embed, slot, f"attachment://{filename}")
+    return discord.File(path, filename=filename)
@@ -0,0 +1,68 @@
+LANGUAGE_TO_FLAG = {
+    "en": "🇺🇸",  # English
+    "ja": "🇯🇵",  # Japanese
+    "fr": "🇫🇷",  # French
+    "de": "🇩🇪",  # German
+    "es": "🇪🇸",  # Spanish
+    "it": "🇮🇹",  # Italian
+    "ru": "🇷🇺",  # Russian
+    "zh": "🇨🇳",  # Chinese (Simplified)
+    "zh-Hant": "🇹🇼",  # Chinese (Traditional)
+    "ko": "🇰🇷",  # Korean
+    "pt": "🇵🇹",  # Portuguese
+    "pt-BR": "🇧🇷",  # Portuguese (Brazil)
+    "nl": "🇳🇱",  # Dutch
+    "sv": "🇸🇪",  # Swedish
+    "da": "🇩🇰",  # Danish
+    "fi": "🇫🇮",  # Finnish
+    "no": "🇳🇴",  # Norwegian
+    "pl": "🇵🇱",  # Polish
+    "cs": "🇨🇿",  # Czech
+    "hu": "🇭🇺",  # Hungarian
+    "ro": "🇷🇴",  # Romanian
+    "el": "🇬🇷",  # Greek
+    "tr": "🇹🇷",  # Turkish
+    "ar": "🇸🇦",  # Arabic
+    "hi": "🇮🇳",  # Hindi
+    "bn": "🇧🇩",  # Bengali
+    "ur": "🇵🇰",  # Urdu
+    "ta": "🇱🇰",  # Tamil
+    "th": "🇹🇭",  # Thai
+    "vi": "🇻🇳",  # Vietnamese
+    "id": "🇮🇩",  # Indonesian
+    "ms": "🇲🇾",  # Malay
+    "tl": "🇵🇭",  # Filipino
+    "fa": "🇮🇷",  # Persian
+    "uk": "🇺🇦",  # Ukrainian
+    "bg": "🇧🇬",  # Bulgarian
+    "hr": "🇭🇷",  # Croatian
+    "sr": "🇷🇸",  # Serbian
+    "sk": "🇸🇰",  # Slovak
+    "sl": "🇸🇮",  # Slovenian
+    "lt": "🇱🇹",  # Lithuanian
+    "lv": "🇱🇻",  # Latvian
+    "et": "🇪🇪",  # Estonian
+    "is": "🇮🇸",  # Icelandic
+    "ga": "🇮🇪",  # Irish
+    "mt": "🇲🇹",  # Maltese
+    "ca": "🇪🇸",  # Catalan
+    "eu": "🇪🇸",  # Basque
+    "gl": "🇪🇸",  # Galician
+    "af": "🇿🇦",  # Afrikaans
+    "sw": "🇰🇪",  # Swahili
+    "am": "🇪🇹",  # Amharic
+    "yo": "🇳🇬",  # Yoruba
+    "ig": "🇳🇬",  # Igbo
+    "ha": "🇳🇬",  # Hausa
+    "zu": "🇿🇦",  # Zulu
+    "xh": "🇿🇦",  # Xhosa
+    "ny": "🇲🇼",  # Chichewa
+    "sn": "🇿🇼",  # Shona
+    "so": "🇸🇴",  # Somali
+    "mg": "🇲🇬",  # Malagasy
+    "la": "🇻🇦",  # Latin
+    "sm": "🇼🇸",  # Samoan
+    "to": "🇹🇴",  # Tongan
+    "mi": "🇳🇿",  # Maori
+    "haw": "🇺🇸",  # Hawaiian
+}
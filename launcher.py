@@ -0,0 +1,67 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# More than one worker requires SHARED_CACHE_URL, separate workers would each spend a full VNDB rate limit from one IP
+WORKER_COUNT = int(os.getenv("WORKER_COUNT") or 1)
+# Defaults to one shard per worker, raise it when Discord asks for more shards than there are workers
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or WORKER_COUNT)
+# Seconds to wait before restarting a worker that exited
+RESTART_DELAY = 5
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def shard_ids(worker, workers=WORKER_COUNT, shard_count=SHARD_COUNT):
+    return list(range(worker, shard_count, workers))
+
+
+def spawn(worker):
+    env = {
+        **os.environ,
+        "SHARD_IDS": ",".join(map(str, shard_ids(worker))),
+        "SHARD_COUNT": str(SHARD_COUNT),
+    }
+    # Each worker serves its own metrics on consecutive ports
+    if os.getenv("METRICS_PORT"):
+        env["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + worker)
+    print(f"Starting worker {worker} with shards {env['SHARD_IDS']} of {SHARD_COUNT}")
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+
+
+def main():
+    if SHARD_COUNT < WORKER_COUNT:
+        sys.exit("SHARD_COUNT must be at least WORKER_COUNT, every worker needs a shard")
+    if WORKER_COUNT > 1 and not os.getenv("SHARED_CACHE_URL"):
+        sys.exit("WORKER_COUNT above 1 requires SHARED_CACHE_URL, so the workers share one VNDB rate limit")
+
+    workers = {worker: spawn(worker) for worker in range(WORKER_COUNT)}
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(1)
+            for worker, process in workers.items():
+                code = process.poll()
+                if code is not None:
+                    print(f"Worker {worker} exited with code {code}, restarting in {RESTART_DELAY}s")
+                    time.sleep(RESTART_DELAY)
+                    workers[worker] = spawn(worker)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,399 +1,449 @@
-import requests
+import time
+# Taken before anything else is imported so the cold start report includes import time
+started = time.perf_counter()
 import discord
 from discord.ext import commands
 from discord import app_commands
 from dotenv import load_dotenv
+import asyncio
+import itertools
 import random
-import os
 import re
+import os
+from vndb import VNDBClient, VNDBError
+from ratelimit import BACKGROUND, RATE_LIMIT_PERIOD, RATE_LIMIT_REQUESTS, RequestScheduler
+from shared_backend import SHARED_CACHE_URL, SharedCache, SharedTokenBucket, connect
+from records import CHARACTER_DETAIL_FIELDS, VN_DETAIL_FIELDS, CharacterDetails, VNDetails
+from embeds import build_collection_embed, build_embed
+from languages import LANGUAGE_TO_FLAG
+from views import PageButton, ResultSelect, add_page_buttons, on_page, on_select, results_view
+from dump_index import CATCH_UP_FIELDS, LOCAL_INDEX_PATH, LocalIndex
+from title_index import TitleIndex
+from random_ids import LENGTHS, RANDOM_POOL_BUDGET, RANDOM_POOL_REFRESH, REFRESH_PAGE_TTL, RandomVNPool
+from prefetch import Prefetcher
+from startup import StartupTimer, command_tree_hash, read_synced_hash, write_synced_hash
+from metrics import (
+    METRICS_PORT, cache_collector, inflight_collector, monitor_loop_lag, prefetch_collector, registry, scheduler_collector, start_server,
+)
+from tracing import end_interaction, start_interaction
+from responses import Responder
+from images import IMAGE_CACHE_PATH, ImageStore, attach_image, is_nsfw_channel
+from series import RELATION_LABELS, fetch_series
 
 load_dotenv()
 TOKEN = os.getenv("TOKEN")
-
-VNDB_API_URL = "https://api.vndb.org/kana"
-
-LANGUAGE_TO_FLAG = {
-    "en": "🇺🇸",  # English
-    "ja": "🇯🇵",  # Japanese
-    "fr": "🇫🇷",  # French
-    "de": "🇩🇪",  # German
-    "es": "🇪🇸",  # Spanish
-    "it": "🇮🇹",  # Italian
-    "ru": "🇷🇺",  # Russian
-    "zh": "🇨🇳",  # Chinese (Simplified)
-    "zh-Hant": "🇹🇼",  # Chinese (Traditional)
-    "ko": "🇰🇷",  # Korean
-    "pt": "🇵🇹",  # Portuguese
-    "pt-BR": "🇧🇷",  # Portuguese (Brazil)
-    "nl": "🇳🇱",  # Dutch
-    "sv": "🇸🇪",  # Swedish
-    "da": "🇩🇰",  # Danish
-    "fi": "🇫🇮",  # Finnish
-    "no": "🇳🇴",  # Norwegian
-    "pl": "🇵🇱",  # Polish
-    "cs": "🇨🇿",  # Czech
-    "hu": "🇭🇺",  # Hungarian
-    "ro": "🇷🇴",  # Romanian
-    "el": "🇬🇷",  # Greek
-    "tr": "🇹🇷",  # Turkish
-    "ar": "🇸🇦",  # Arabic
-    "hi": "🇮🇳",  # Hindi
-    "bn": "🇧🇩",  # Bengali
-    "ur": "🇵🇰",  # Urdu
-    "ta": "🇱🇰",  # Tamil
-    "th": "🇹🇭",  # Thai
-    "vi": "🇻🇳",  # Vietnamese
-    "id": "🇮🇩",  # Indonesian
-    "ms": "🇲🇾",  # Malay
-    "tl": "🇵🇭",  # Filipino
-    "fa": "🇮🇷",  # Persian
-    "uk": "🇺🇦",  # Ukrainian
-    "bg": "🇧🇬",  # Bulgarian
-    "hr": "🇭🇷",  # Croatian
-    "sr": "🇷🇸",  # Serbian
-    "sk": "🇸🇰",  # Slovak
-    "sl": "🇸🇮",  # Slovenian
-    "lt": "🇱🇹",  # Lithuanian
-    "lv": "🇱🇻",  # Latvian
-    "et": "🇪🇪",  # Estonian
-    "is": "🇮🇸",  # Icelandic
-    "ga": "🇮🇪",  # Irish
-    "mt": "🇲🇹",  # Maltese
-    "ca": "🇪🇸",  # Catalan
-    "eu": "🇪🇸",  # Basque
-    "gl": "🇪🇸",  # Galician
-    "af": "🇿🇦",  # Afrikaans
-    "sw": "🇰🇪",  # Swahili
-    "am": "🇪🇹",  # Amharic
-    "yo": "🇳🇬",  # Yoruba
-    "ig": "🇳🇬",  # Igbo
-    "ha": "🇳🇬",  # Hausa
-    "zu": "🇿🇦",  # Zulu
-    "xh": "🇿🇦",  # Xhosa
-    "ny": "🇲🇼",  # Chichewa
-    "sn": "🇿🇼",  # Shona
-    "so": "🇸🇴",  # Somali
-    "mg": "🇲🇬",  # Malagasy
-    "la": "🇻🇦",  # Latin
-    "sm": "🇼🇸",  # Samoan
-    "to": "🇹🇴",  # Tongan
-    "mi": "🇳🇿",  # Maori
-    "haw": "🇺🇸",  # Hawaiian
+# Set by launcher.py when running as one of several worker processes
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS", "").split(",") if i.strip()] or None
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+
+if SHARED_CACHE_URL:
+    # Workers share cached responses and one VNDB rate limit budget
+    shared_connection = connect(SHARED_CACHE_URL)
+    vndb = VNDBClient(
+        shared_cache=SharedCache(shared_connection),
+        scheduler=RequestScheduler(SharedTokenBucket(shared_connection, RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD)),
+    )
+else:
+    shared_connection = None
+    vndb = VNDBClient()
+local_index = LocalIndex(LOCAL_INDEX_PATH) if LOCAL_INDEX_PATH else None
+# In-process title indexes backing autocomplete, filled from the dump index and from search results
+title_indexes = {"vn": TitleIndex(), "character": TitleIndex()}
+random_pool = RandomVNPool()
+image_store = ImageStore(IMAGE_CACHE_PATH) if IMAGE_CACHE_PATH else None
+prefetcher = Prefetcher(vndb)
+registry.add_collector(cache_collector(vndb.cache))
+registry.add_collector(inflight_collector(vndb.inflight))
+registry.add_collector(scheduler_collector(vndb.scheduler))
+registry.add_collector(prefetch_collector(prefetcher))
+startup_timer = StartupTimer(started)
+
+# Discord shows at most 25 options in a dropdown
+SEARCH_PAGE_SIZE = 25
+# sort choice -> (VNDB sort field, descending)
+SORTS = {
+    "relevance": ("searchrank", False),
+    "rating": ("rating", True),
+    "popularity": ("votecount", True),
+    "newest": ("released", True),
+    "title": ("title", False),
+    "name": ("name", False),
 }
+VN_SORT_CHOICES = {"relevance": "Relevance", "rating": "Rating", "popularity": "Popularity", "newest": "Newest", "title": "Title"}
+CHARACTER_SORT_CHOICES = {"relevance": "Relevance", "name": "Name"}
+# /vncompare and /vnseries have a single order, their page buttons still need a sort in the custom_id
+COLLECTION_SORT = "default"
+VN_ID = re.compile(r'v[0-9]+')
+
+
+class VNCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.type is discord.InteractionType.application_command:
+            start_interaction(interaction, f"/{interaction.command.qualified_name}")
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error):
+        end_interaction(interaction, "error")
+        await super().on_error(interaction, error)
+
+
+class VNBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        startup_timer.mark("login")
+        await vndb.start()
+        if METRICS_PORT:
+            await start_server(METRICS_PORT)
+            self.loop.create_task(monitor_loop_lag())
+        self.add_dynamic_items(ResultSelect, PageButton)
+        # Everything slow happens after connecting, commands work meanwhile with less local data
+        self.loop.create_task(load_title_indexes())
+        self.loop.create_task(refresh_random_pool())
+        # Commands are global, one worker syncing them is enough
+        if SHARD_IDS is None or 0 in SHARD_IDS:
+            await sync_commands()
+
+    async def close(self):
+        await vndb.close()
+        if shared_connection is not None:
+            await shared_connection.aclose()
+        if local_index is not None:
+            local_index.close()
+        if image_store is not None:
+            await image_store.close()
+        await super().close()
+
+
+async def sync_commands(force=False):
+    # Syncing is rate limited by Discord, so only sync when the commands actually changed
+    tree_hash = command_tree_hash(bot.tree)
+    if not force and read_synced_hash() == tree_hash:
+        print("Command tree unchanged, skipping sync")
+        return None
+    synced = await bot.tree.sync()
+    try:
+        write_synced_hash(tree_hash)
+    except OSError as e:
+        print(f"Failed to save the command tree hash: {e}")
+    print(f"Synced {len(synced)} commands")
+    return synced
+
+
+async def load_title_indexes():
+    if local_index is None:
+        return
+    for endpoint, index in title_indexes.items():
+        for count, (item_id, label, names) in enumerate(local_index.iter_titles(endpoint), 1):
+            index.add(item_id, label, names)
+            # Hand the loop back regularly so interactions are not held up by the load
+            if count % 5000 == 0:
+                await asyncio.sleep(0)
+        stats = index.stats()
+        print(f"Indexed {stats['titles']} {endpoint} titles for autocomplete ({stats['bytes_per_title']:.0f} bytes per title)")
+
+
+async def refresh_local_index():
+    # Entries added to VNDB after the dump are crawled into the index in the background, so searches
+    # never wait on the API for them. Pages are spaced out like the random pool refresh.
+    page_delay = RATE_LIMIT_PERIOD / RATE_LIMIT_REQUESTS / RANDOM_POOL_BUDGET
+    added = 0
+    for endpoint, prefix in (("vn", "v"), ("character", "c")):
+        while True:
+            data = await vndb.query(
+                endpoint, ["id", ">", f"{prefix}{local_index.max_id(endpoint)}"], CATCH_UP_FIELDS[endpoint],
+                sort="id", results=100, cache_ttl=REFRESH_PAGE_TTL, priority=BACKGROUND,
+            )
+            results = data.get('results', [])
+            await asyncio.to_thread(local_index.add_entries, endpoint, results)
+            index_titles(endpoint, results)
+            added += len(results)
+            if not data.get('more') or not results:
+                break
+            await asyncio.sleep(page_delay)
+    return added
+
+
+async def seed_random_pool():
+    # With a local index the pool is fed from it, the index already crawls the VNs newer than the dump.
+    # Only called once that crawl finished, so the pool is complete afterwards.
+    entries = local_index.iter_vn_attributes(random_pool.max_id)
+    seeded = 0
+    while True:
+        batch = list(itertools.islice(entries, 1000))
+        if not batch:
+            break
+        random_pool.add_many(batch)
+        seeded += len(batch)
+        await asyncio.sleep(0)
+    if seeded:
+        random_pool.complete = True
+        random_pool.save()
+    return seeded
+
+
+async def refresh_random_pool():
+    random_pool.load()
+    while True:
+        try:
+            if local_index is not None:
+                indexed = await refresh_local_index()
+                if indexed:
+                    print(f"Added {indexed} entries newer than the dump to the local index")
+                added = await seed_random_pool()
+                # Indexes imported before the VN attribute columns existed cannot seed the pool
+                if not random_pool.complete:
+                    added = await random_pool.refresh(vndb)
+            else:
+                added = await random_pool.refresh(vndb)
+            if added:
+                print(f"Random pool now holds {len(random_pool)} visual novels ({added} new)")
+        except VNDBError as e:
+            print(f"Failed to refresh the random pool: {e}")
+        await asyncio.sleep(RANDOM_POOL_REFRESH)
 
-EMBED_COLOR = 0x757e8a
 
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="D!", intents=intents)
+# Slash commands and components only need guild events, everything else is traffic for nothing
+intents = discord.Intents.none()
+intents.guilds = True
+bot = VNBot(command_prefix="D!", intents=intents, shard_ids=SHARD_IDS, shard_count=SHARD_COUNT, tree_cls=VNCommandTree)
 
 @bot.event
 async def on_ready():
     await bot.change_presence(activity=discord.Game(name="🌲linktr.ee/Stying"))
-    await bot.tree.sync()
+    startup_timer.mark("ready")
     print(f'We have logged in as {bot.user.name}')
 
-def format_description(description):
-    if description is None:
-        return "N/A"
-    
-    url_pattern = re.compile(r'\[url=(https?://[^\]]+)\](.*?)\[/url\]')
-    relative_url_pattern = re.compile(r'\[url=/([^\]]+)\](.*?)\[/url\]')
-    
-    formatted_description = re.sub(url_pattern, r'[\2](\1)', description)
-    formatted_description = re.sub(relative_url_pattern, r'[\2](https://vndb.org/\1)', formatted_description)
-    
-    return formatted_description
-
-def truncate_text(text, limit=1024):
-    if text is None:
-        return "N/A"
-    return text if len(text) <= limit else text[:limit - 3] + "..."
-
-def fetch_vn_details(vn_id):
-    request_data = {
-        "filters": ["id", "=", vn_id],
-        "fields": "title,alttitle,titles.title,titles.lang,description,relations.id,relations.relation,relations.title,platforms,image.url,length,length_minutes,languages"
-    }
-
-    response = requests.post(f"{VNDB_API_URL}/vn", headers={'Content-Type': 'application/json'}, json=request_data)
-
-    if response.status_code == 200:
-        data = response.json()
-        vn_info = data.get('results', [{}])[0]
-
-        if vn_info:
-            title = vn_info.get('title', 'N/A')
-            original_title = vn_info.get('alttitle', 'N/A')
-            alternate_names = [t.get('title', 'N/A') for t in vn_info.get('titles', []) if t.get('lang') != 'ja']
-            description = format_description(vn_info.get('description', 'N/A'))
-            related_media = vn_info.get('relations', [])
-            platforms = vn_info.get('platforms', [])
-            cover = vn_info.get('image', {}).get('url', 'N/A')
-            length_minutes = vn_info.get('length_minutes')
-            languages = vn_info.get('languages', [])
-
-            if length_minutes is not None:
-                try:
-                    length_minutes = int(length_minutes)
-                    hours = length_minutes // 60
-                    minutes = length_minutes % 60
-                    if hours > 0 and minutes > 0:
-                        length_formatted = f"{hours} hours {minutes} minutes"
-                    elif hours > 0:
-                        length_formatted = f"{hours} hours"
-                    elif minutes > 0:
-                        length_formatted = f"{minutes} minutes"
-                    else:
-                        length_formatted = "N/A"
-                except ValueError:
-                    length_formatted = "N/A"
-            else:
-                length_formatted = "N/A"
-
-            related_vns = ", ".join([f"[{rel['title']}](https://vndb.org/{rel['id']})" for rel in related_media]) if related_media else "N/A"
-
-            return {
-                "title": title,
-                "original_title": original_title,
-                "alternate_names": alternate_names,
-                "description": description,
-                "related_vns": related_vns,
-                "platforms": platforms,
-                "cover": cover,
-                "length": length_formatted,
-                "languages": languages
-            }
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    end_interaction(interaction)
+    startup_timer.mark("first_command")
+
+def index_titles(endpoint, results):
+    index = title_indexes[endpoint]
+    for result in results:
+        if endpoint == "vn":
+            index.add(result['id'], result['title'], [result.get('alttitle') or '', *result.get('aliases', [])])
         else:
-            return None
-    else:
+            index.add(result['id'], result['name'], [result.get('original') or '', *result.get('aliases', [])])
+
+async def search_vndb(endpoint, name, fields, page=1, sort="relevance"):
+    # Answer from the local index when possible, it also holds the entries crawled since the dump.
+    # The index only ranks by relevance.
+    if local_index is not None and sort == "relevance":
+        results = local_index.search(endpoint, name, SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE)
+        if results:
+            return {"results": results[:SEARCH_PAGE_SIZE], "more": len(results) > SEARCH_PAGE_SIZE}
+    order, reverse = SORTS.get(sort, SORTS["relevance"])
+    data = await vndb.query(
+        endpoint, ["search", "=", name], fields,
+        results=SEARCH_PAGE_SIZE, page=page, sort=order, **({"reverse": True} if reverse else {}),
+    )
+    index_titles(endpoint, data.get('results', []))
+    return data
+
+def autocomplete_titles(endpoint):
+    # Runs on every keystroke, so it only ever reads the in-process index
+    async def autocomplete(interaction: discord.Interaction, current: str):
+        return [
+            app_commands.Choice(name=label[:100], value=label[:100])
+            for _, label in title_indexes[endpoint].complete(current)
+        ]
+    return autocomplete
+
+async def fetch_vn_details(vn_id):
+    try:
+        vn_info = await vndb.get_vn(vn_id, VN_DETAIL_FIELDS)
+    except VNDBError:
         return None
+    return VNDetails.from_api(vn_id, vn_info) if vn_info else None
 
 
-def fetch_character_details(char_id):
-    request_data = {
-        "filters": ["id", "=", char_id],
-        "fields": "id, name, original, aliases, description, image.url, blood_type, height, weight, bust, waist, hips, cup, age, birthday, sex, vns.title, vns.role, vns.id"
-    }
-
-    response = requests.post(f"{VNDB_API_URL}/character", json=request_data)
-
-    if response.status_code == 200:
-        data = response.json()
-        char_info = data.get('results', [{}])[0]
-
-        if char_info:
-            name = char_info.get('name', 'N/A')
-            original_name = char_info.get('original', 'N/A')
-            aliases = char_info.get('aliases', [])
-            height = char_info.get('height', 'N/A')
-            weight = char_info.get('weight', 'N/A')
-            bust = char_info.get('bust', 'N/A')
-            waist = char_info.get('waist', 'N/A')
-            hips = char_info.get('hips', 'N/A')
-            cup = char_info.get('cup', 'N/A')
-            age = char_info.get('age', 'N/A')
-            birthday = char_info.get('birthday', 'N/A')
-            blood_type = char_info.get('blood_type', 'N/A')
-            sex = char_info.get('sex', [])
-            description = format_description(truncate_text(char_info.get('description', 'N/A')))
-            vn_roles = char_info.get('vns', [])
-            image_url = char_info.get('image', {}).get('url', None)
-
-            measurements = (
-                f"- **Height:**\n - {height} cm\n"
-                f"- **Weight:**\n - {weight} kg\n"
-                f"- **Bust - Waist - Hips:** \n - {bust} cm\n - {waist} cm\n - {hips} cm\n"
-                f"- **Cup:**\n - {cup}"
-            ) if height != 'N/A' else "N/A"
-
-            visual_novels = "\n".join([f"[{vn['title']}](https://vndb.org/{vn['id']}) ({vn['role']})" for vn in vn_roles]) if vn_roles else "N/A"
-            visual_novels = truncate_text(visual_novels)
-
-            unique_sex = set(sex)
-            sex_output = ", ".join(['♂️ Male' if s == 'm' else '♀️ Female' if s == 'f' else '⚪ Not Specified' for s in unique_sex])
-
-            return {
-                "name": name,
-                "original_name": original_name,
-                "aliases": aliases,
-                "measurements": measurements,
-                "age": age,
-                "birthday": birthday,
-                "blood_type": blood_type,
-                "sex": sex_output,
-                "role": visual_novels,
-                "description": description,
-                "image_url": image_url
-            }
-        else:
-            return None
-    else:
+async def fetch_character_details(char_id):
+    try:
+        char_info = await vndb.get_character(char_id, CHARACTER_DETAIL_FIELDS)
+    except VNDBError:
         return None
+    return CharacterDetails.from_api(char_id, char_info) if char_info else None
+
+
+def vn_options(results):
+    options = []
+    for result in results:
+        title = result['title']
+        olang = result.get('olang', 'en')
+        flag = LANGUAGE_TO_FLAG.get(olang, '🏳️')
+        truncated_title = title[:90] + "..." if len(title) > 90 else title
+        display_name = f"{flag} {truncated_title}"
+
+        description = ", ".join(result['aliases']) if result['aliases'] else "N/A"
+        description = description[:100]
+
+        options.append(
+            discord.SelectOption(
+                label=display_name,
+                description=description,
+                value=result['id']
+            )
+        )
+    return options
+
+
+def character_options(results):
+    options = []
+    for result in results:
+        name = result['name']
+        aliases = result.get('aliases', [])
+        sex = result.get('sex', [])
+
+        # Create description with aliases
+        description = ", ".join(aliases) if aliases else "N/A"
+
+        # Include gender emoji based on sex
+        sex_emoji = '♂️' if 'm' in sex else '♀️' if 'f' in sex else '⚪'
+        display_name = f"{sex_emoji} {name}"
+
+        truncated_description = description[:100]  # Truncate description to fit dropdown
+
+        options.append(
+            discord.SelectOption(
+                label=display_name,
+                description=truncated_description,
+                value=result['id']
+            )
+        )
+    return options
+
+
+def cover_options(results):
+    options = []
+    for result in results:
+        title = result['title']
+        truncated_title = title[:90] + "..." if len(title) > 90 else title
+
+        aliases = result.get('aliases', [])
+        description = ", ".join(aliases) if aliases else "N/A"
+        if len(description) > 100:
+            description = description[:97] + "..."
+
+        options.append(
+            discord.SelectOption(
+                label=truncated_title,
+                description=description,
+                value=result['id']
+            )
+        )
+    return options
+
+
+# kind -> (endpoint, search fields, option builder, detail fields to prefetch)
+SEARCHES = {
+    "vn": ("vn", "id,title,aliases,olang", vn_options, VN_DETAIL_FIELDS),
+    "character": ("character", "id,name,original,aliases,sex", character_options, CHARACTER_DETAIL_FIELDS),
+    "cover": ("vn", "id,title,image.url,aliases", cover_options, VN_DETAIL_FIELDS),
+}
+
+
+async def search_page(kind, name, sort="relevance", page=1):
+    # Returns the message for one page of results, and its view (None when the page is empty)
+    endpoint, fields, build_options, detail_fields = SEARCHES[kind]
+    data = await search_vndb(endpoint, name, fields, page, sort)
+    results = data.get('results', [])
+    if not results:
+        return ("No results found." if page == 1 else "No more results."), None
+
+    more = data.get('more', False)
+    ids = [result['id'] for result in results]
+    view = results_view(kind, build_options(results), name, sort, page, more)
+    prefetcher.schedule(endpoint, ids, detail_fields)
+    page_label = f" (page {page})" if page > 1 or more else ""
+    return f"{len(results)} results found{page_label}. Select one from the list below:", view
 
 
 @app_commands.allowed_installs(guilds=True, users=True)
 @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 @bot.tree.command(name="vn", description="Search for a Visual Novel in VNDB")
-async def vn_search(interaction: discord.Interaction, name: str):
-    search_query = {
-        "filters": ["search", "=", name],
-        "fields": "id,title,aliases,olang"
-    }
+@app_commands.autocomplete(name=autocomplete_titles("vn"))
+@app_commands.choices(sort=[app_commands.Choice(name=name, value=value) for value, name in VN_SORT_CHOICES.items()])
+async def vn_search(interaction: discord.Interaction, name: str, sort: app_commands.Choice[str] = None):
+    reply = Responder(interaction)
+    try:
+        content, view = await search_page("vn", name, sort.value if sort else "relevance")
+    except VNDBError as e:
+        print(f"Error searching for visual novels (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send(f"Error searching for visual novels. Please try again later.", ephemeral=False)
+        return
 
-    response = requests.post(f"{VNDB_API_URL}/vn", json=search_query)
+    await reply.send(content, view=view, ephemeral=False)
 
-    if response.status_code == 200:
-        data = response.json()
-        results = data.get('results', [])
-        if results:
-            options = []
-            for result in results:
-                title = result['title']
-                olang = result.get('olang', 'en')
-                flag = LANGUAGE_TO_FLAG.get(olang, '🏳️')
-                truncated_title = title[:90] + "..." if len(title) > 90 else title
-                display_name = f"{flag} {truncated_title}"
-
-                description = ", ".join(result['aliases']) if result['aliases'] else "N/A"
-                description = description[:100]
-
-                options.append(
-                    discord.SelectOption(
-                        label=display_name,
-                        description=description,
-                        value=result['id']
-                    )
-                )
-
-            class VNDropdown(discord.ui.Select):
-                def __init__(self):
-                    super().__init__(placeholder="Select a visual novel...", min_values=1, max_values=1, options=options)
-
-                async def callback(self, interaction: discord.Interaction):
-                    selected_id = self.values[0]
-                    vn_details = fetch_vn_details(selected_id)
-
-                    if vn_details:
-                        embed = discord.Embed(
-                            title=vn_details['title'],
-                            url=f"https://vndb.org/{selected_id}",
-                            description=vn_details['description'],
-                            color=EMBED_COLOR
-                        )
-                        embed.set_thumbnail(url=vn_details['cover'])
-                        embed.add_field(name="🏷️ __Original Name:__", value=truncate_text(vn_details['original_title']), inline=False)
-                        embed.add_field(name="🔄 __Alternate Names:__", value=truncate_text(", ".join(vn_details['alternate_names']) if vn_details['alternate_names'] else "N/A"), inline=False)
-                        embed.add_field(name="⏳ __Playtime:__", value=truncate_text(vn_details['length']), inline=False)
-                        embed.add_field(name="🌐 __Languages:__", value=truncate_text(" ".join(LANGUAGE_TO_FLAG.get(lang, '🏳️') for lang in vn_details['languages'])), inline=False)
-                        embed.add_field(name="🎮 __Platforms:__", value=truncate_text(", ".join(vn_details['platforms'])), inline=False)
-                        embed.add_field(name="🔗 __Related Media:__", value=truncate_text(vn_details['related_vns']), inline=False)
-
-                        buttons = VNButtonPanel(selected_id)
-
-                        await interaction.response.send_message(embed=embed, view=buttons)
-                    else:
-                        await interaction.response.send_message(f"No details found for the selected visual novel.", ephemeral=False)
-
-
-            view = discord.ui.View()
-            view.add_item(VNDropdown())
-
-            await interaction.response.send_message(f"{len(results)} results found. Select one from the list below:", view=view, ephemeral=False)
-        else:
-            await interaction.response.send_message(f"No results found.", ephemeral=False)
+
+@on_select("vn")
+async def vn_selected(interaction: discord.Interaction, selected_id: str):
+    reply = Responder(interaction)
+    prefetcher.record_selection("vn", selected_id)
+    vn_details = await fetch_vn_details(selected_id)
+
+    if vn_details:
+        embed = build_embed(vn_details, "vn")
+        cover = await attach_image(
+            image_store, embed, "thumbnail", vn_details.cover, vn_details.cover_sexual, vn_details.cover_violence, is_nsfw_channel(interaction),
+        )
+
+        buttons = VNButtonPanel(selected_id)
+
+        await reply.send(embed=embed, view=buttons, file=cover)
     else:
-        await interaction.response.send_message(f"Error searching for visual novels. Please try again later.", ephemeral=False)
+        await reply.send(f"No details found for the selected visual novel.", ephemeral=False)
 
 
 @app_commands.allowed_installs(guilds=True, users=True)
 @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 @bot.tree.command(name="character", description="Search for a character in VNDB")
-async def character_search(interaction: discord.Interaction, name: str):
-    search_query = {
-        "filters": ["search", "=", name],
-        "fields": "id,name,original,aliases,sex"
-    }
+@app_commands.autocomplete(name=autocomplete_titles("character"))
+@app_commands.choices(sort=[app_commands.Choice(name=name, value=value) for value, name in CHARACTER_SORT_CHOICES.items()])
+async def character_search(interaction: discord.Interaction, name: str, sort: app_commands.Choice[str] = None):
+    reply = Responder(interaction)
+    try:
+        content, view = await search_page("character", name, sort.value if sort else "relevance")
+    except VNDBError as e:
+        print(f"Error searching for characters (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send(f"Error searching for characters. Please try again later.", ephemeral=False)
+        return
 
-    response = requests.post(f"{VNDB_API_URL}/character", json=search_query)
+    await reply.send(content, view=view, ephemeral=False)
 
-    if response.status_code == 200:
-        data = response.json()
-        results = data.get('results', [])
-        if results:
-            options = []
-            for result in results:
-                name = result['name']
-                original_name = result.get('original', 'N/A')
-                aliases = result.get('aliases', [])
-                sex = result.get('sex', [])
-
-                # Create description with aliases
-                description = ", ".join(aliases) if aliases else "N/A"
-                
-                # Include gender emoji based on sex
-                sex_emoji = '♂️' if 'm' in sex else '♀️' if 'f' in sex else '⚪'
-                display_name = f"{sex_emoji} {name}"
-                
-                truncated_description = description[:100]  # Truncate description to fit dropdown
-
-                options.append(
-                    discord.SelectOption(
-                        label=display_name,
-                        description=truncated_description,
-                        value=result['id']
-                    )
-                )
-
-            class CharacterDropdown(discord.ui.Select):
-                def __init__(self):
-                    super().__init__(placeholder="Select a character...", min_values=1, max_values=1, options=options)
-
-                async def callback(self, interaction: discord.Interaction):
-                    selected_id = self.values[0]
-                    char_details = fetch_character_details(selected_id)
-
-                    if char_details:
-                        embed = discord.Embed(
-                            title=char_details['name'],
-                            url=f"https://vndb.org/{selected_id}",
-                            description=char_details['description'],
-                            color=EMBED_COLOR
-                        )
-                        embed.set_thumbnail(url=char_details['image_url'])
-                        embed.add_field(name="🏷️ __Original Name:__", value=truncate_text(char_details['original_name']), inline=False)
-                        embed.add_field(name="🔄 __Aliases:__", value=truncate_text(", ".join(char_details['aliases']) if char_details['aliases'] else "N/A"), inline=False)
-                        embed.add_field(name="📏 __Measurements:__", value=char_details['measurements'], inline=False)
-                        embed.add_field(name="🎂 __Birthday (Month, Day):__", value=char_details['birthday'], inline=False)
-                        embed.add_field(name="🩸 __Blood Type:__", value=char_details['blood_type'], inline=False)
-                        embed.add_field(name="♂️ __Gender:__", value=char_details['sex'], inline=False)
-                        embed.add_field(name="🎭 __Roles:__", value=char_details['role'], inline=False)
-
-                        buttons = CharacterButtonPanel(selected_id)
-
-                        await interaction.response.send_message(embed=embed, view=buttons)
-                    else:
-                        await interaction.response.send_message(f"No details found for the selected character.", ephemeral=False)
-
-            view = discord.ui.View()
-            view.add_item(CharacterDropdown())
-
-            await interaction.response.send_message(f"{len(results)} results found. Select one from the list below:", view=view, ephemeral=False)
-        else:
-            await interaction.response.send_message(f"No results found.", ephemeral=False)
+
+@on_select("character")
+async def character_selected(interaction: discord.Interaction, selected_id: str):
+    reply = Responder(interaction)
+    prefetcher.record_selection("character", selected_id)
+    char_details = await fetch_character_details(selected_id)
+
+    if char_details:
+        embed = build_embed(char_details, "character")
+        image = await attach_image(
+            image_store, embed, "thumbnail", char_details.image_url, char_details.image_sexual, char_details.image_violence, is_nsfw_channel(interaction),
+        )
+
+        buttons = CharacterButtonPanel(selected_id)
+
+        await reply.send(embed=embed, view=buttons, file=image)
     else:
-        await interaction.response.send_message(f"Error searching for characters. Please try again later.", ephemeral=False)
+        await reply.send(f"No details found for the selected character.", ephemeral=False)
 
 
 class CharacterButtonPanel(discord.ui.View):
     def __init__(self, char_id):
-        super().__init__()
+        # Link buttons never send interactions, so there is nothing to time out
+        super().__init__(timeout=None)
         self.char_id = char_id
 
         self.add_item(discord.ui.Button(label="More Info", url=f"https://vndb.org/{self.char_id}"))
 
 class VNButtonPanel(discord.ui.View):
     def __init__(self, vn_id):
-        super().__init__()
+        # Link buttons never send interactions, so there is nothing to time out
+        super().__init__(timeout=None)
         self.vn_id = vn_id
 
         self.add_item(discord.ui.Button(label="More Info", url=f"https://vndb.org/{self.vn_id}"))
@@ -402,112 +452,260 @@ class VNButtonPanel(discord.ui.View):
 @app_commands.allowed_installs(guilds=True, users=True)
 @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 @bot.tree.command(name="randomvn", description="Fetch a random visual novel")
-async def random_vn(interaction: discord.Interaction):
-    # Acknowledge the interaction first
-    await interaction.response.defer()
+@app_commands.describe(language="Language code the VN is available in, e.g. en", platform="Platform code, e.g. win")
+@app_commands.choices(length=[app_commands.Choice(name=name, value=value) for value, name in LENGTHS.items()])
+async def random_vn(interaction: discord.Interaction, language: str = None, length: app_commands.Choice[int] = None, platform: str = None):
+    reply = Responder(interaction)
+
+    filters = {"language": language, "length": length.value if length else None, "platform": platform}
+    # A pool still being filled for the first time only holds the oldest ids, the guess below covers every VN
+    if random_pool.complete:
+        # Pick from the known-valid ids, retrying a couple of times if one was deleted since the last refresh
+        for _ in range(3):
+            random_id = random_pool.pick(**filters)
+            if random_id is None:
+                break
+            try:
+                if await vndb.get_vn(random_id, VN_DETAIL_FIELDS):
+                    break
+            except VNDBError:
+                break
+            random_pool.discard(random_id)
+
+        if random_id is None:
+            await reply.send("No visual novels match those filters.", ephemeral=False)
+            return
+        await send_random_vn(reply, random_id, await fetch_vn_details(random_id))
+        return
+
+    if any(filters.values()):
+        await reply.send("Filtered random picks are still loading. Please try again later.", ephemeral=False)
+        return
 
     # Step 1: Fetch the highest VN ID
-    highest_id_response = requests.post(f"{VNDB_API_URL}/vn", headers={'Content-Type': 'application/json'}, json={"sort": "id", "reverse": True, "results": 1})
-    
-    if highest_id_response.status_code == 200:
-        highest_id_data = highest_id_response.json()
-        highest_id = highest_id_data.get('results', [{}])[0].get('id', None)
+    try:
+        highest_id_data = await vndb.vn(fields="id", sort="id", reverse=True, results=1)
+    except VNDBError as e:
+        print(f"Error fetching the highest VN ID (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        highest_id_data = None
+
+    if highest_id_data is not None:
+        highest_id = (highest_id_data.get('results') or [{}])[0].get('id', None)
 
         if highest_id:
             # Step 2: Generate a random VN ID
             random_id = f"v{random.randint(1, int(highest_id[1:]))}"
             
             # Step 3: Fetch details for the random VN ID
-            vn_details = fetch_vn_details(random_id)
-            
-            if vn_details:
-                embed = discord.Embed(
-                    title=vn_details['title'],
-                    url=f"https://vndb.org/{random_id}",
-                    description=vn_details['description'],
-                    color=EMBED_COLOR
-                )
-                embed.set_thumbnail(url=vn_details['cover'])
-                embed.add_field(name="🏷️ __Original Name:__", value=truncate_text(vn_details['original_title']), inline=False)
-                embed.add_field(name="🔄 __Alternate Names:__", value=truncate_text(", ".join(vn_details['alternate_names']) if vn_details['alternate_names'] else "N/A"), inline=False)
-                embed.add_field(name="⏳ __Playtime:__", value=truncate_text(vn_details['length']), inline=False)
-                embed.add_field(name="🌐 __Languages:__", value=truncate_text(" ".join(LANGUAGE_TO_FLAG.get(lang, '🏳️') for lang in vn_details['languages'])), inline=False)
-                embed.add_field(name="🎮 __Platforms:__", value=truncate_text(", ".join(vn_details['platforms'])), inline=False)
-                embed.add_field(name="🔗 __Related Media:__", value=truncate_text(vn_details['related_vns']), inline=False)
-
-                buttons = VNButtonPanel(random_id)
-
-                await interaction.followup.send(embed=embed, view=buttons)
-            else:
-                await interaction.followup.send("No details found for the selected visual novel.", ephemeral=False)
+            vn_details = await fetch_vn_details(random_id)
+            await send_random_vn(reply, random_id, vn_details)
         else:
-            await interaction.followup.send("Unable to determine the highest VN ID.", ephemeral=False)
+            await reply.send("Unable to determine the highest VN ID.", ephemeral=False)
+    else:
+        await reply.send("Error fetching the highest VN ID. Please try again later.", ephemeral=False)
+
+
+async def send_random_vn(reply, random_id, vn_details):
+    if vn_details:
+        embed = build_embed(vn_details, "vn")
+        cover = await attach_image(
+            image_store, embed, "thumbnail", vn_details.cover, vn_details.cover_sexual, vn_details.cover_violence, is_nsfw_channel(reply.interaction),
+        )
+
+        buttons = VNButtonPanel(random_id)
+
+        await reply.send(embed=embed, view=buttons, file=cover)
     else:
-        await interaction.followup.send("Error fetching the highest VN ID. Please try again later.", ephemeral=False)
+        await reply.send("No details found for the selected visual novel.", ephemeral=False)
 
 
 @app_commands.allowed_installs(guilds=True, users=True)
 @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 @bot.tree.command(name="cover", description="Search for a Visual Novel cover in VNDB")
-async def cover_search(interaction: discord.Interaction, name: str):
-    search_query = {
-        "filters": ["search", "=", name],
-        "fields": "id,title,image.url,aliases"
-    }
-
+@app_commands.autocomplete(name=autocomplete_titles("vn"))
+@app_commands.choices(sort=[app_commands.Choice(name=name, value=value) for value, name in VN_SORT_CHOICES.items()])
+async def cover_search(interaction: discord.Interaction, name: str, sort: app_commands.Choice[str] = None):
+    reply = Responder(interaction)
     try:
-        response = requests.post(f"{VNDB_API_URL}/vn", json=search_query)
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        data = response.json()
-        results = data.get('results', [])
+        content, view = await search_page("cover", name, sort.value if sort else "relevance")
+    except VNDBError as e:
+        # Handle any request-related errors
+        print(f"Error searching for covers (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send("Error searching for visual novels. Please try again later.", ephemeral=True)
+        return
+
+    await reply.send(content, view=view, ephemeral=False)
+
+@on_select("cover")
+async def cover_selected(interaction: discord.Interaction, selected_id: str):
+    reply = Responder(interaction)
+    prefetcher.record_selection("vn", selected_id)
+    vn_details = await fetch_vn_details(selected_id)
+
+    if vn_details:
+        embed = build_embed(vn_details, "cover")
+        cover = await attach_image(
+            image_store, embed, "image", vn_details.cover, vn_details.cover_sexual, vn_details.cover_violence, is_nsfw_channel(interaction),
+        )
+
+        await reply.send(embed=embed, file=cover)
+    else:
+        await reply.send("No details found for the selected visual novel.", ephemeral=True)
+
 
+async def resolve_vn(name):
+    # Takes a VN id or a title and returns (id, details or None). A title searched on the API comes back
+    # with the detail fields already, so it needs no second request.
+    name = name.strip()
+    if VN_ID.fullmatch(name.lower()):
+        return name.lower(), None
+    if local_index is not None:
+        results = local_index.search("vn", name, 1)
         if results:
-            options = []
-            for result in results:
-                title = result['title']
-                truncated_title = title[:90] + "..." if len(title) > 90 else title
-
-                aliases = result.get('aliases', [])
-                description = ", ".join(aliases) if aliases else "N/A"
-                if len(description) > 100:
-                    description = description[:97] + "..."
-
-                options.append(
-                    discord.SelectOption(
-                        label=truncated_title,
-                        description=description,
-                        value=result['id']
-                    )
-                )
-
-            class CoverDropdown(discord.ui.Select):
-                def __init__(self):
-                    super().__init__(placeholder="Select a visual novel...", min_values=1, max_values=1, options=options)
-
-                async def callback(self, interaction: discord.Interaction):
-                    selected_id = self.values[0]
-                    vn_details = fetch_vn_details(selected_id)
-
-                    if vn_details:
-                        embed = discord.Embed(
-                            title=vn_details['title'],
-                            url=f"https://vndb.org/{selected_id}",
-                            color=EMBED_COLOR
-                        )
-                        embed.set_image(url=vn_details['cover'])
-
-                        await interaction.response.send_message(embed=embed)
-                    else:
-                        await interaction.response.send_message("No details found for the selected visual novel.", ephemeral=True)
-
-            view = discord.ui.View()
-            view.add_item(CoverDropdown())
-
-            await interaction.response.send_message(f"{len(results)} results found. Select one from the list below:", view=view, ephemeral=False)
-        else:
-            await interaction.response.send_message("No results found.", ephemeral=False)
-    except requests.exceptions.RequestException as e:
-        # Handle any request-related errors
-        await interaction.response.send_message(f"Error searching for visual novels: {e}", ephemeral=True)
+            return results[0]['id'], None
+    data = await vndb.query("vn", ["search", "=", name], VN_DETAIL_FIELDS, results=1, sort="searchrank")
+    results = data.get('results') or []
+    return (results[0]['id'], results[0]) if results else (None, None)
+
+
+async def fetch_compare(ids, known=None):
+    # Everything not already known is fetched concurrently, which the batcher sends as one request
+    infos = {**await vndb.get_vns([i for i in ids if i not in (known or {})], VN_DETAIL_FIELDS), **(known or {})}
+    return [(VNDetails.from_api(i, infos[i]), None) for i in ids if infos.get(i)]
+
+
+async def fetch_series_entries(root_id, known=None):
+    found = await fetch_series(vndb, root_id, VN_DETAIL_FIELDS, known=known)
+    records = {info['id']: VNDetails.from_api(info['id'], info) for info, _ in found}
+    entries = [
+        (records[info['id']], f"{RELATION_LABELS.get(via[0], via[0])} of {records[via[1]].title}" if via else None)
+        for info, via in found
+    ]
+    # Release order, unreleased entries last
+    entries.sort(key=lambda entry: entry[0].released if (entry[0].released or "")[:1].isdigit() else "9999")
+    return entries, records.get(root_id)
+
+
+async def collection_page(kind, key, page, known=None):
+    # Returns the embed and view for one page of /vncompare or /vnseries, or (None, None) when nothing was found
+    if kind == "series":
+        entries, root = await fetch_series_entries(key, known)
+        title = f"{root.title} series" if root else None
+    else:
+        entries = await fetch_compare(key.split(","), known)
+        title = "Visual novel comparison"
+    if not entries:
+        return None, None
+    embed, more = build_collection_embed(title, entries, page)
+    return embed, add_page_buttons(discord.ui.View(timeout=None), kind, COLLECTION_SORT, page, key, more)
+
+
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@bot.tree.command(name="vncompare", description="Compare several visual novels side by side")
+@app_commands.describe(
+    first="Visual novel name or ID, e.g. v17", second="Visual novel name or ID",
+    third="Visual novel name or ID", fourth="Visual novel name or ID", fifth="Visual novel name or ID",
+)
+@app_commands.autocomplete(
+    first=autocomplete_titles("vn"), second=autocomplete_titles("vn"), third=autocomplete_titles("vn"),
+    fourth=autocomplete_titles("vn"), fifth=autocomplete_titles("vn"),
+)
+async def vn_compare(interaction: discord.Interaction, first: str, second: str, third: str = None, fourth: str = None, fifth: str = None):
+    reply = Responder(interaction)
+    names = [name for name in (first, second, third, fourth, fifth) if name]
+    try:
+        # All names are looked up at once, so this costs about one round trip however many are given
+        resolved = await asyncio.gather(*(resolve_vn(name) for name in names))
+        ids = list(dict.fromkeys(vn_id for vn_id, _ in resolved if vn_id))
+        embed, view = await collection_page("compare", ",".join(ids), 1, {vn_id: info for vn_id, info in resolved if info}) if ids else (None, None)
+    except VNDBError as e:
+        print(f"Error comparing visual novels (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send("Error fetching visual novels. Please try again later.", ephemeral=True)
+        return
+
+    if embed is None:
+        await reply.send("No results found.", ephemeral=False)
+        return
+    await reply.send(embed=embed, view=view)
+
+
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@bot.tree.command(name="vnseries", description="List a visual novel together with its related entries")
+@app_commands.describe(name="Visual novel name or ID, e.g. v17")
+@app_commands.autocomplete(name=autocomplete_titles("vn"))
+async def vn_series(interaction: discord.Interaction, name: str):
+    reply = Responder(interaction)
+    try:
+        root_id, root_info = await resolve_vn(name)
+        known = {root_id: root_info} if root_info else None
+        embed, view = await collection_page("series", root_id, 1, known) if root_id else (None, None)
+    except VNDBError as e:
+        print(f"Error fetching a visual novel series (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send("Error fetching visual novels. Please try again later.", ephemeral=True)
+        return
+
+    if embed is None:
+        await reply.send("No results found.", ephemeral=False)
+        return
+    await reply.send(embed=embed, view=view)
+
+
+@on_page("vn", "character", "cover")
+async def page_selected(interaction: discord.Interaction, kind: str, query: str, sort: str, page: int):
+    reply = Responder(interaction, update=True)
+    try:
+        content, view = await search_page(kind, query, sort, page)
+    except VNDBError as e:
+        print(f"Error fetching page {page} of {kind} results (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send("Error fetching more results. Please try again later.", ephemeral=True)
+        return
+
+    if view is None:
+        await reply.send(content, ephemeral=True)
+        return
+    await reply.edit(content=content, view=view)
+
+
+@on_page("series", "compare")
+async def collection_page_selected(interaction: discord.Interaction, kind: str, key: str, sort: str, page: int):
+    reply = Responder(interaction, update=True)
+    try:
+        embed, view = await collection_page(kind, key, page)
+    except VNDBError as e:
+        print(f"Error fetching page {page} of {kind} (interaction {interaction.id}): {e}")
+        interaction.extras["status"] = "vndb_error"
+        await reply.send("Error fetching more results. Please try again later.", ephemeral=True)
+        return
+
+    if embed is None:
+        await reply.send("No results found.", ephemeral=True)
+        return
+    await reply.edit(embed=embed, view=view)
+
+
+@bot.tree.command(name="sync", description="Sync the bot's slash commands with Discord (bot owner only)")
+@app_commands.default_permissions(administrator=True)
+async def sync(interaction: discord.Interaction):
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can sync commands.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        synced = await sync_commands(force=True)
+    except discord.HTTPException as e:
+        print(f"Error syncing commands: {e}")
+        await interaction.followup.send("Failed to sync commands. Please try again later.", ephemeral=True)
+        return
+    await interaction.followup.send(f"Synced {len(synced)} commands.", ephemeral=True)
+
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    startup_timer.mark("import")
+    bot.run(TOKEN)
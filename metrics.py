@@ -0,0 +1,232 @@
+import asyncio
+import os
+import time
+
+from aiohttp import web
+
+# Port of the Prometheus /metrics endpoint, disabled when unset
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Seconds between event loop lag probes
+LOOP_LAG_INTERVAL = 0.5
+
+# Seconds, covering everything from a cache hit to a request that ran into the timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        # For counters copied from stats kept elsewhere
+        self._values[labels] = value
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, value, *labels):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-2] += 1
+        counts[-1] += value
+
+    def samples(self):
+        names = (*self.labelnames, "le")
+        for labels, counts in self._values.items():
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                total += count
+                yield f"{self.name}_bucket", _labels(names, (*labels, bound)), total
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), counts[-1]
+            yield f"{self.name}_count", _labels(self.labelnames, labels), total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # Called before every scrape to copy stats kept elsewhere into gauges
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+COMMAND_LATENCY = registry.register(Histogram(
+    "vnbot_command_duration_seconds", "Time from receiving an interaction to finishing its handler", ("command", "status"),
+))
+VNDB_LATENCY = registry.register(Histogram(
+    "vnbot_vndb_request_duration_seconds", "Latency of requests sent to the VNDB API", ("endpoint", "status"),
+))
+VNDB_INFLIGHT = registry.register(Gauge(
+    "vnbot_vndb_requests_in_flight", "VNDB requests currently waiting for a response",
+))
+CACHE_EVENTS = registry.register(Counter(
+    "vnbot_cache_events_total", "Response cache lookups and removals since startup", ("event",),
+))
+CACHE_HIT_RATIO = registry.register(Gauge(
+    "vnbot_cache_hit_ratio", "Share of response cache lookups answered from memory or disk",
+))
+COALESCED_REQUESTS = registry.register(Counter(
+    "vnbot_vndb_coalesced_requests_total", "VNDB lookups that joined an identical request already in flight",
+))
+VNDB_QUEUE_DEPTH = registry.register(Gauge(
+    "vnbot_vndb_queue_depth", "VNDB requests waiting for a rate limit token", ("lane",),
+))
+VNDB_SCHEDULED = registry.register(Counter(
+    "vnbot_vndb_scheduled_requests_total", "VNDB requests that were given a rate limit token", ("lane",),
+))
+VNDB_QUEUE_WAIT = registry.register(Counter(
+    "vnbot_vndb_queue_wait_seconds_total", "Time VNDB requests spent waiting for a rate limit token", ("lane",),
+))
+VNDB_QUEUE_WAIT_MAX = registry.register(Gauge(
+    "vnbot_vndb_queue_wait_max_seconds", "Longest a VNDB request waited for a rate limit token", ("lane",),
+))
+VNDB_RETRIES = registry.register(Counter(
+    "vnbot_vndb_retries_total", "VNDB requests retried after a 429 or a 5xx response",
+))
+VNDB_TOKENS = registry.register(Gauge(
+    "vnbot_vndb_rate_limit_tokens", "Rate limit tokens left in this process's bucket",
+))
+PREFETCH_EVENTS = registry.register(Counter(
+    "vnbot_prefetch_events_total", "Details prefetched for search results and what became of them", ("event",),
+))
+PREFETCH_HIT_RATIO = registry.register(Gauge(
+    "vnbot_prefetch_hit_ratio", "Share of selected results whose details had been prefetched",
+))
+INTERACTION_ACK_LATENCY = registry.register(Histogram(
+    "vnbot_interaction_ack_seconds", "Time from receiving an interaction to its first response or defer", ("command",),
+))
+INTERACTION_DEFERS = registry.register(Counter(
+    "vnbot_interaction_defers_total", "Interactions deferred because their handler used up the defer budget", ("command",),
+))
+INTERACTION_MISSES = registry.register(Counter(
+    "vnbot_interaction_deadline_misses_total", "Interactions answered after Discord's 3 second deadline", ("command",),
+))
+LOOP_LAG = registry.register(Histogram(
+    "vnbot_event_loop_lag_seconds", "How late the event loop ran a timer", buckets=LAG_BUCKETS,
+))
+
+
+def cache_collector(cache):
+    def collect():
+        stats = cache.stats.as_dict()
+        for event, value in stats.items():
+            CACHE_EVENTS.set(value, event)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        CACHE_HIT_RATIO.set((stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0)
+    return collect
+
+
+def inflight_collector(inflight):
+    def collect():
+        COALESCED_REQUESTS.set(inflight.saved)
+    return collect
+
+
+def scheduler_collector(scheduler):
+    def collect():
+        stats = scheduler.stats()
+        for lane, lane_stats in stats["lanes"].items():
+            VNDB_QUEUE_DEPTH.set(lane_stats["queue_depth"], lane)
+            VNDB_SCHEDULED.set(lane_stats["served"], lane)
+            VNDB_QUEUE_WAIT.set(lane_stats["wait_total"], lane)
+            VNDB_QUEUE_WAIT_MAX.set(lane_stats["wait_max"], lane)
+        VNDB_RETRIES.set(stats["retries"])
+        # The shared bucket lives in Redis and has no local count
+        if stats["tokens"] is not None:
+            VNDB_TOKENS.set(stats["tokens"])
+    return collect
+
+
+def prefetch_collector(prefetcher):
+    def collect():
+        stats = prefetcher.stats()
+        for event in ("fetched", "hits", "misses", "wasted"):
+            PREFETCH_EVENTS.set(stats[event], event)
+        PREFETCH_HIT_RATIO.set(stats["hit_rate"])
+    return collect
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+async def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    async def handle(request):
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+
+from ratelimit import BACKGROUND
+
+# How many of the top search results get their details fetched while the dropdown is open, 0 disables
+PREFETCH_RESULTS = int(os.getenv("PREFETCH_RESULTS", "3"))
+# Prefetched entries not selected within this many seconds count as wasted
+PREFETCH_WINDOW = 180.0
+
+
+class Prefetcher:
+    def __init__(self, client, limit=PREFETCH_RESULTS, window=PREFETCH_WINDOW):
+        self.client = client
+        self.limit = limit
+        self.window = window
+        self.fetched = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        # (endpoint, id) -> time it was prefetched
+        self._pending = {}
+        self._tasks = set()
+
+    def stats(self):
+        selections = self.hits + self.misses
+        return {
+            "fetched": self.fetched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "wasted": self.wasted,
+            "hit_rate": self.hits / selections if selections else 0.0,
+        }
+
+    def schedule(self, endpoint, ids, fields):
+        ids = [i for i in ids[:self.limit] if (endpoint, i) not in self._pending]
+        if not ids:
+            return
+        self._expire()
+        now = time.monotonic()
+        for item_id in ids:
+            self._pending[(endpoint, item_id)] = now
+        self.fetched += len(ids)
+
+        # The ids are requested together so the batcher sends them as one query
+        task = asyncio.ensure_future(self.client.get_many(endpoint, ids, fields, priority=BACKGROUND))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def record_selection(self, endpoint, item_id):
+        if self._pending.pop((endpoint, item_id), None) is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.window
+        expired = []
+        # Entries are kept in insertion order, so the scan stops at the first fresh one
+        for key, fetched_at in self._pending.items():
+            if fetched_at >= cutoff:
+                break
+            expired.append(key)
+        for key in expired:
+            del self._pending[key]
+        self.wasted += len(expired)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled():
+            # Failures only mean the selection falls back to a normal fetch
+            task.exception()
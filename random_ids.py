@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import json
+import os
+import random
+from array import array
+
+from ratelimit import BACKGROUND, RATE_LIMIT_PERIOD, RATE_LIMIT_REQUESTS
+
+# Where the known-valid VN ids are persisted between restarts
+RANDOM_POOL_PATH = os.getenv("RANDOM_POOL_PATH", "random_pool.json")
+# Seconds between background refreshes picking up newly added VNs
+RANDOM_POOL_REFRESH = float(os.getenv("RANDOM_POOL_REFRESH", "21600"))
+# Share of the VNDB rate limit a refresh may use, the rest stays free for commands
+RANDOM_POOL_BUDGET = float(os.getenv("RANDOM_POOL_BUDGET", "0.25"))
+# Refresh pages are cached just long enough for workers refreshing together to share them
+REFRESH_PAGE_TTL = 60
+# Pages between saves, so a long refresh interrupted by a restart resumes where it stopped
+REFRESH_SAVE_EVERY = 20
+
+LENGTHS = {1: "Very short", 2: "Short", 3: "Medium", 4: "Long", 5: "Very long"}
+
+
+def _bits(bitmap):
+    # Expands an int bitmap into the sorted array of its set bit positions
+    members = array('I')
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for offset, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            members.append(offset * 8 + low.bit_length() - 1)
+            byte ^= low
+    return members
+
+
+class RandomVNPool:
+    def __init__(self, path=RANDOM_POOL_PATH):
+        self.path = path
+        self.max_id = 0
+        # Set once a full pass reached the newest VN, until then the pool only holds the oldest ids
+        self.complete = False
+        # Python ints used as bitmaps indexed by the numeric VN id, so filters intersect with a single &
+        self._all = 0
+        self._attributes = {}
+        # filter tuple -> array of matching ids, rebuilt after the pool changes
+        self._members = {}
+
+    def __len__(self):
+        return bin(self._all).count("1")
+
+    def add(self, vn_id, languages=(), length=None, platforms=()):
+        self.add_many([(vn_id, languages, length, platforms)])
+
+    def add_many(self, entries):
+        # Bits are gathered relative to the lowest id and shifted into place once, instead of
+        # reallocating every full-size bitmap per entry
+        entries = [(int(vn_id[1:]), *rest) for vn_id, *rest in entries]
+        if not entries:
+            return
+        base = min(number for number, *_ in entries)
+        page_all = 0
+        page_attributes = {}
+        for number, languages, length, platforms in entries:
+            bit = 1 << (number - base)
+            page_all |= bit
+            for key in (*(("language", l) for l in languages), ("length", length), *(("platform", p) for p in platforms)):
+                if key[1] is not None:
+                    page_attributes[key] = page_attributes.get(key, 0) | bit
+            self.max_id = max(self.max_id, number)
+
+        self._all |= page_all << base
+        for key, bitmap in page_attributes.items():
+            self._attributes[key] = self._attributes.get(key, 0) | (bitmap << base)
+        self._members.clear()
+
+    def discard(self, vn_id):
+        mask = ~(1 << int(vn_id[1:]))
+        self._all &= mask
+        for key in self._attributes:
+            self._attributes[key] &= mask
+        self._members.clear()
+
+    def pick(self, language=None, length=None, platform=None):
+        filters = tuple(f for f in (("language", language), ("length", length), ("platform", platform)) if f[1] is not None)
+        members = self._members.get(filters)
+        if members is None:
+            bitmap = self._all
+            for key in filters:
+                bitmap &= self._attributes.get(key, 0)
+            members = self._members[filters] = _bits(bitmap)
+        return f"v{random.choice(members)}" if members else None
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        self.max_id = data["max_id"]
+        self.complete = data.get("complete", False)
+        self._all = int(data["all"], 16)
+        self._attributes = {
+            (kind, int(value) if kind == "length" else value): int(bitmap, 16)
+            for kind, value, bitmap in data["attributes"]
+        }
+        self._members.clear()
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "max_id": self.max_id,
+            "complete": self.complete,
+            "all": format(self._all, 'x'),
+            "attributes": [[kind, value, format(bitmap, 'x')] for (kind, value), bitmap in self._attributes.items()],
+        }
+        # Per-process temp file, several workers may save the same pool at once
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    async def refresh(self, client, budget=RANDOM_POOL_BUDGET):
+        # Only VNs added since the last refresh are fetched, deleted ones are dropped when a pick finds nothing.
+        # Pages are spaced out so the refresh never takes more than its share of the rate limit.
+        page_delay = RATE_LIMIT_PERIOD / RATE_LIMIT_REQUESTS / budget
+        added = 0
+        for page in itertools.count(1):
+            data = await client.vn(
+                ["id", ">", f"v{self.max_id}"], "id,languages,length,platforms",
+                sort="id", results=100, cache_ttl=REFRESH_PAGE_TTL, priority=BACKGROUND,
+            )
+            results = data.get('results', [])
+            self.add_many([
+                (r['id'], r.get('languages') or (), r.get('length'), r.get('platforms') or ()) for r in results
+            ])
+            added += len(results)
+            if not data.get('more'):
+                break
+            if page % REFRESH_SAVE_EVERY == 0:
+                self.save()
+            await asyncio.sleep(page_delay)
+        if added or not self.complete:
+            self.complete = True
+            self.save()
+        return added
@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+
+# VNDB allows 200 requests per 5 minutes per client
+RATE_LIMIT_REQUESTS = int(os.getenv("VNDB_RATE_LIMIT_REQUESTS", "200"))
+RATE_LIMIT_PERIOD = float(os.getenv("VNDB_RATE_LIMIT_PERIOD", "300"))
+MAX_RETRIES = int(os.getenv("VNDB_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Priority lanes, lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+LANES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+# Priority of one request, shared by every caller waiting on it so that one joining later can raise it
+class Ticket:
+    def __init__(self, priority=INTERACTIVE):
+        self.priority = priority
+        self._listeners = []
+
+    def listen(self, callback):
+        self._listeners.append(callback)
+
+    def raise_to(self, priority):
+        if priority < self.priority:
+            self.priority = priority
+            for callback in self._listeners:
+                callback()
+
+
+def as_ticket(priority):
+    return priority if isinstance(priority, Ticket) else Ticket(priority)
+
+
+def is_retryable(status):
+    return status == 429 or (status is not None and 500 <= status < 600)
+
+
+class TokenBucket:
+    def __init__(self, capacity=RATE_LIMIT_REQUESTS, period=RATE_LIMIT_PERIOD):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take(self):
+        # Takes a token, or returns how many seconds to wait until one is available
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    async def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class LaneStats:
+    __slots__ = ("queued", "served", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.queued = 0
+        self.served = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self):
+        return {
+            "queue_depth": self.queued,
+            "served": self.served,
+            "wait_total": self.wait_total,
+            "wait_avg": self.wait_total / self.served if self.served else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+class RequestScheduler:
+    def __init__(self, bucket=None, max_retries=MAX_RETRIES):
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.retries = 0
+        self.lanes = {lane: LaneStats() for lane in LANES}
+        # [priority, seq, enqueued, future], future is None for entries replaced by a promotion
+        self._waiters = []
+        self._seq = itertools.count()
+        self._dispatcher = None
+
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "tokens": getattr(self.bucket, 'tokens', None),
+            "lanes": {LANES[lane]: stats.as_dict() for lane, stats in self.lanes.items()},
+        }
+
+    async def acquire(self, priority=INTERACTIVE):
+        ticket = as_ticket(priority)
+        lane = self.lanes[ticket.priority]
+        if not self._waiters and not await self.bucket.take():
+            lane.served += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [ticket.priority, next(self._seq), time.monotonic(), future]
+        heapq.heappush(self._waiters, entry)
+        lane.queued += 1
+        ticket.listen(lambda: self._promote(entry, ticket.priority))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+
+    def _promote(self, entry, priority):
+        # Moves a queued request to a higher lane, keeping its place among the requests queued before it
+        future = entry[3]
+        if future is None or future.done() or priority >= entry[0]:
+            return
+        self.lanes[entry[0]].queued -= 1
+        entry[3] = None
+        heapq.heappush(self._waiters, [priority, entry[1], entry[2], future])
+        self.lanes[priority].queued += 1
+
+    async def _dispatch(self):
+        while self._waiters:
+            wait = await self.bucket.take()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            while self._waiters:
+                priority, _, enqueued, future = heapq.heappop(self._waiters)
+                if future is None:
+                    continue
+                lane = self.lanes[priority]
+                lane.queued -= 1
+                if future.done():
+                    continue
+                waited = time.monotonic() - enqueued
+                lane.served += 1
+                lane.wait_total += waited
+                lane.wait_max = max(lane.wait_max, waited)
+                future.set_result(None)
+                break
+            else:
+                # Every waiter gave up, hand the token back
+                await self.bucket.refund()
+
+    async def run(self, send, priority=INTERACTIVE):
+        attempt = 0
+        while True:
+            await self.acquire(priority)
+            try:
+                return await send()
+            except Exception as e:
+                status = getattr(e, 'status', None)
+                if attempt >= self.max_retries or not is_retryable(status):
+                    raise
+                if status == 429:
+                    await self.bucket.drain()
+
+                # A server asking for a longer wait than BACKOFF_MAX is not waited on for longer than that
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after:
+                    delay = min(BACKOFF_MAX, retry_after)
+                else:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
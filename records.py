@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+
+from formatting import FIELD_LIMIT, format_description
+
+VN_DETAIL_FIELDS = "title,alttitle,titles.title,titles.lang,description,relations.id,relations.relation,relations.title,platforms,image.url,image.sexual,image.violence,length,length_minutes,languages,released,rating"
+CHARACTER_DETAIL_FIELDS = "id, name, original, aliases, description, image.url, image.sexual, image.violence, blood_type, height, weight, bust, waist, hips, cup, age, birthday, sex, vns.title, vns.role, vns.id"
+
+
+def format_length(length_minutes):
+    if length_minutes is None:
+        return "N/A"
+    try:
+        length_minutes = int(length_minutes)
+    except ValueError:
+        return "N/A"
+
+    hours = length_minutes // 60
+    minutes = length_minutes % 60
+    if hours > 0 and minutes > 0:
+        return f"{hours} hours {minutes} minutes"
+    elif hours > 0:
+        return f"{hours} hours"
+    elif minutes > 0:
+        return f"{minutes} minutes"
+    return "N/A"
+
+
+# Only the fields the embeds use, with descriptions already converted to Markdown.
+# Lists are shared with the cached API response rather than copied.
+@dataclass
+class VNDetails:
+    __slots__ = (
+        "id", "title", "original_title", "alternate_names", "description", "related_vns",
+        "platforms", "cover", "cover_sexual", "cover_violence", "length", "languages", "released", "rating",
+    )
+    id: str
+    title: str
+    original_title: str
+    alternate_names: tuple
+    description: str
+    related_vns: str
+    platforms: list
+    cover: str
+    cover_sexual: float
+    cover_violence: float
+    length: str
+    languages: list
+    released: str
+    # Bayesian rating from 10 to 100
+    rating: float
+
+    @classmethod
+    def from_api(cls, vn_id, vn_info):
+        image = vn_info.get('image') or {}
+        return cls(
+            id=vn_id,
+            title=vn_info.get('title') or 'N/A',
+            original_title=vn_info.get('alttitle') or 'N/A',
+            alternate_names=tuple(t.get('title', 'N/A') for t in vn_info.get('titles') or () if t.get('lang') != 'ja'),
+            description=format_description(vn_info.get('description')),
+            related_vns=", ".join(f"[{rel['title']}](https://vndb.org/{rel['id']})" for rel in vn_info.get('relations') or ()) or "N/A",
+            platforms=vn_info.get('platforms') or [],
+            cover=image.get('url'),
+            cover_sexual=image.get('sexual'),
+            cover_violence=image.get('violence'),
+            length=format_length(vn_info.get('length_minutes')),
+            languages=vn_info.get('languages') or [],
+            released=vn_info.get('released'),
+            rating=vn_info.get('rating'),
+        )
+
+
+@dataclass
+class CharacterDetails:
+    __slots__ = (
+        "id", "name", "original_name", "aliases", "description", "image_url", "image_sexual", "image_violence", "blood_type",
+        "height", "weight", "bust", "waist", "hips", "cup", "age", "birthday", "sex", "vns",
+    )
+    id: str
+    name: str
+    original_name: str
+    aliases: list
+    description: str
+    image_url: str
+    image_sexual: float
+    image_violence: float
+    blood_type: str
+    height: int
+    weight: int
+    bust: int
+    waist: int
+    hips: int
+    cup: str
+    age: int
+    birthday: list
+    sex: list
+    # (id, title, role) triples
+    vns: tuple
+
+    @classmethod
+    def from_api(cls, char_id, char_info):
+        image = char_info.get('image') or {}
+        return cls(
+            id=char_id,
+            name=char_info.get('name') or 'N/A',
+            original_name=char_info.get('original') or 'N/A',
+            aliases=char_info.get('aliases') or [],
+            description=format_description(char_info.get('description'), FIELD_LIMIT),
+            image_url=image.get('url'),
+            image_sexual=image.get('sexual'),
+            image_violence=image.get('violence'),
+            blood_type=char_info.get('blood_type'),
+            height=char_info.get('height'),
+            weight=char_info.get('weight'),
+            bust=char_info.get('bust'),
+            waist=char_info.get('waist'),
+            hips=char_info.get('hips'),
+            cup=char_info.get('cup'),
+            age=char_info.get('age'),
+            birthday=char_info.get('birthday'),
+            sex=char_info.get('sex') or [],
+            vns=tuple((vn['id'], vn['title'], vn['role']) for vn in char_info.get('vns') or ()),
+        )
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import time
+
+import discord
+
+from metrics import INTERACTION_ACK_LATENCY, INTERACTION_DEFERS, INTERACTION_MISSES
+
+# Discord fails an interaction that is not acknowledged within 3 seconds of being created
+INTERACTION_DEADLINE = 3.0
+# Seconds a handler may spend before the interaction is deferred for it
+DEFER_BUDGET = float(os.getenv("DEFER_BUDGET", "1.5"))
+# Kept free before the deadline for the defer request itself to reach Discord
+DEFER_MARGIN = 0.5
+
+# Discord error code for an interaction that expired or was already acknowledged
+UNKNOWN_INTERACTION = 10062
+
+
+# Answers with a normal response while the handler is fast (e.g. served from cache), and defers
+# once the budget is used up so a slow VNDB reply ends up in a followup instead of a failed interaction
+class Responder:
+    def __init__(self, interaction, budget=DEFER_BUDGET, ephemeral=False, update=False):
+        # ephemeral: whether the handler's main reply is ephemeral, the defer's placeholder matches it.
+        # update: the reply edits the message the component is on instead of sending a new one.
+        self.interaction = interaction
+        self.ephemeral = ephemeral
+        self.update = update
+        self.name = interaction.extras.get("name", "unknown")
+        self.deferred = False
+        self._lock = asyncio.Lock()
+        self._received = time.perf_counter()
+        created_at = getattr(interaction, "created_at", None)
+        age = (discord.utils.utcnow() - created_at).total_seconds() if created_at else 0.0
+        delay = max(0.0, min(budget, INTERACTION_DEADLINE - DEFER_MARGIN - max(0.0, age)))
+        self._deadline = self._received + INTERACTION_DEADLINE - max(0.0, age)
+        self._timer = asyncio.get_running_loop().create_task(self._defer_later(delay))
+        interaction.extras["responder"] = self
+
+    async def _defer_later(self, delay):
+        await asyncio.sleep(delay)
+        # Past this point the defer request may already be on its way, so it must not be cancelled
+        self._timer = None
+        async with self._lock:
+            if self.interaction.response.is_done():
+                return
+            try:
+                if self.update:
+                    await self.interaction.response.defer()
+                else:
+                    await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+            except discord.NotFound as e:
+                self._missed(e)
+                return
+            self.deferred = True
+            INTERACTION_DEFERS.inc(self.name)
+            self._acknowledged()
+
+    def _acknowledged(self):
+        INTERACTION_ACK_LATENCY.observe(time.perf_counter() - self._received, self.name)
+        if time.perf_counter() > self._deadline:
+            INTERACTION_MISSES.inc(self.name)
+
+    def _missed(self, error):
+        if error.code != UNKNOWN_INTERACTION:
+            raise error
+        INTERACTION_MISSES.inc(self.name)
+        self.interaction.extras["status"] = "deadline_missed"
+        print(f"Interaction {self.interaction.id} ({self.name}) expired before it was answered")
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def send(self, content=None, **kwargs):
+        self.cancel()
+        for key in ("file", "view"):
+            if kwargs.get(key, ...) is None:
+                del kwargs[key]
+        async with self._lock:
+            try:
+                if self.interaction.response.is_done():
+                    if self.deferred and not self.update and kwargs.get("ephemeral", False) != self.ephemeral:
+                        # The first followup would take over the placeholder and its visibility, so a reply
+                        # meant to be private is not posted publicly (or the other way round)
+                        try:
+                            await self.interaction.delete_original_response()
+                        except discord.HTTPException as e:
+                            print(f"Failed to remove the placeholder of interaction {self.interaction.id}: {e}")
+                    await self.interaction.followup.send(content, **kwargs)
+                    return
+                await self.interaction.response.send_message(content, **kwargs)
+            except discord.NotFound as e:
+                self._missed(e)
+                return
+            self._acknowledged()
+
+    async def edit(self, **kwargs):
+        self.cancel()
+        async with self._lock:
+            try:
+                if self.interaction.response.is_done():
+                    await self.interaction.edit_original_response(**kwargs)
+                    return
+                await self.interaction.response.edit_message(**kwargs)
+            except discord.NotFound as e:
+                self._missed(e)
+                return
+            self._acknowledged()
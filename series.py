@@ -0,0 +1,49 @@
+import os
+
+# How many relation hops /vnseries follows from the starting VN
+SERIES_MAX_DEPTH = int(os.getenv("SERIES_MAX_DEPTH", "3"))
+SERIES_MAX_ENTRIES = 50
+
+RELATION_LABELS = {
+    "seq": "Sequel",
+    "preq": "Prequel",
+    "set": "Same setting",
+    "alt": "Alternative version",
+    "char": "Shares characters",
+    "side": "Side story",
+    "par": "Parent story",
+    "ser": "Same series",
+    "fan": "Fandisc",
+    "orig": "Original game",
+}
+# Relations followed when collecting a series, shared characters alone link otherwise unrelated works
+SERIES_RELATIONS = set(RELATION_LABELS) - {"char"}
+
+
+async def fetch_series(client, root_id, fields, max_depth=SERIES_MAX_DEPTH, max_entries=SERIES_MAX_ENTRIES, known=None):
+    # Breadth-first over relations.id. Every level is fetched concurrently, so the batcher turns it into
+    # a single request and the whole walk costs one round trip per level. Entries in known are not fetched.
+    # Returns [(vn info, (relation, related id) or None)] in the order the entries were reached.
+    known = known or {}
+    found = {}
+    reached_by = {root_id: None}
+    frontier = [root_id]
+    for depth in range(max_depth + 1):
+        infos = {**await client.get_vns([i for i in frontier if i not in known], fields), **known}
+        next_frontier = []
+        for vn_id in frontier:
+            info = infos.get(vn_id)
+            if not info:
+                continue
+            found[vn_id] = info
+            if depth == max_depth:
+                continue
+            for relation in info.get('relations') or ():
+                related_id = relation['id']
+                if relation.get('relation') in SERIES_RELATIONS and related_id not in reached_by and len(reached_by) < max_entries:
+                    reached_by[related_id] = (relation['relation'], vn_id)
+                    next_frontier.append(related_id)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return [(found[vn_id], via) for vn_id, via in reached_by.items() if vn_id in found]
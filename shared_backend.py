@@ -0,0 +1,96 @@
+import json
+import os
+import time
+
+from ratelimit import TokenBucket
+
+# Redis-compatible server shared by every worker process, disabled when unset
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL")
+
+KEY_PREFIX = "vndb:"
+
+# Token bucket kept in a Redis hash so all workers draw from one VNDB budget.
+# ARGV: capacity, refill rate per second, now, mode (take, refund or drain). Returns the seconds to wait.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local wait = 0
+if ARGV[4] == 'take' then
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+elseif ARGV[4] == 'refund' then
+    tokens = math.min(capacity, tokens + 1)
+else
+    tokens = math.min(tokens, 0)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return tostring(wait)
+"""
+
+
+def connect(url=SHARED_CACHE_URL):
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("SHARED_CACHE_URL is set but the redis package is not installed, run: pip install redis")
+    return redis.from_url(url)
+
+
+class SharedCache:
+    def __init__(self, connection):
+        self._redis = connection
+        self.errors = 0
+
+    async def get(self, key):
+        try:
+            value = await self._redis.get(KEY_PREFIX + key)
+        except Exception:
+            # The shared tier is an optimization, an unreachable server only means a miss
+            self.errors += 1
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value, ttl):
+        try:
+            await self._redis.set(KEY_PREFIX + key, json.dumps(value, separators=(",", ":"), ensure_ascii=False), ex=max(1, int(ttl)))
+        except Exception:
+            self.errors += 1
+
+
+class SharedTokenBucket:
+    def __init__(self, connection, capacity, period, name="ratelimit"):
+        self._redis = connection
+        self._script = connection.register_script(TOKEN_BUCKET_SCRIPT)
+        self.key = KEY_PREFIX + name
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.errors = 0
+        # Used while the server is unreachable so requests keep flowing at this worker's own pace
+        self._fallback = TokenBucket(capacity, period)
+
+    async def _call(self, mode):
+        try:
+            return float(await self._script(keys=[self.key], args=[self.capacity, self.rate, time.time(), mode]))
+        except Exception:
+            self.errors += 1
+            return await getattr(self._fallback, mode)()
+
+    async def take(self):
+        return await self._call("take")
+
+    async def refund(self):
+        await self._call("refund")
+
+    async def drain(self):
+        await self._call("drain")
@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+import time
+
+# Where the hash of the last synced command tree is kept, so restarts only sync when commands changed
+COMMAND_HASH_PATH = os.getenv("COMMAND_HASH_PATH", ".command_tree_hash")
+
+# Cold start milestones, in the order they are reached
+PHASES = ("import", "login", "ready", "first_command")
+
+
+def command_tree_hash(tree):
+    payload = [command.to_dict(tree) for command in sorted(tree.get_commands(), key=lambda c: c.name)]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_synced_hash(path=COMMAND_HASH_PATH):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def write_synced_hash(tree_hash, path=COMMAND_HASH_PATH):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(tree_hash)
+    os.replace(tmp_path, path)
+
+
+class StartupTimer:
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.marks = {}
+
+    def mark(self, phase):
+        # Only the first time counts, reconnects fire ready again
+        if phase in self.marks:
+            return False
+        self.marks[phase] = time.perf_counter() - self.started
+        if phase in ("ready", "first_command"):
+            self.report()
+        return True
+
+    def report(self):
+        timings = ", ".join(f"{phase} {self.marks[phase]:.2f}s" for phase in PHASES if phase in self.marks)
+        print(f"Cold start: {timings}")
@@ -0,0 +1,72 @@
+from title_index import TitleIndex, normalize
+
+
+def make_index():
+    index = TitleIndex()
+    index.add("v4", "Clannad", ["クラナド"])
+    index.add("v2002", "Steins;Gate")
+    index.add("v11", "Fate/stay night", ["Fate stay night"])
+    index.add("v17", "Ever17 -the out of infinity-")
+    index.add("v97", "Saya no Uta", ["Song of Saya"])
+    index.add("v1", "C")
+    return index
+
+
+def ids(results):
+    return [item_id for item_id, _ in results]
+
+
+def test_normalize():
+    assert normalize("Tōhō") == normalize("Touhou")
+    assert normalize("Steins;Gate") == normalize("STEINS GATE")
+    assert normalize("クラナド") == normalize("くらなど")
+
+
+def test_one_character_matches_the_start_of_a_title():
+    index = make_index()
+    assert ids(index.complete("c")) == ["v1", "v4"]
+    assert ids(index.complete("s")) == ["v2002", "v97", "v11"]
+
+
+def test_two_characters():
+    index = make_index()
+    assert ids(index.complete("cl")) == ["v4"]
+    assert ids(index.complete("st")) == ["v2002", "v11"]
+
+
+def test_titles_starting_with_the_query_rank_first():
+    index = make_index()
+    assert ids(index.complete("sa")) == ["v97"]
+    assert ids(index.complete("saya")) == ["v97"]
+    assert ids(index.complete("stay")) == ["v11"]
+    assert ids(index.complete("infinity")) == ["v17"]
+
+
+def test_alternate_names_and_kana():
+    index = make_index()
+    assert ids(index.complete("song")) == ["v97"]
+    assert ids(index.complete("クラ")) == ["v4"]
+    assert ids(index.complete("くらな")) == ["v4"]
+
+
+def test_no_match():
+    index = make_index()
+    assert index.complete("") == []
+    assert index.complete("zzz") == []
+
+
+def test_update_replaces_names():
+    index = make_index()
+    assert ids(index.complete("cl")) == ["v4"]
+    index.add("v4", "Kanon")
+    assert ids(index.complete("cl")) == []
+    assert ids(index.complete("kan")) == ["v4"]
+    assert len(index) == 6
+
+
+def test_limit():
+    index = TitleIndex()
+    for number in range(40):
+        index.add(f"v{number}", f"Story {number}")
+    assert len(index.complete("s")) == 25
+    assert len(index.complete("story", limit=5)) == 5
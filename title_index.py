@@ -0,0 +1,127 @@
+import heapq
+import re
+import sys
+import unicodedata
+from array import array
+
+# Discord accepts at most 25 autocomplete choices
+MAX_CHOICES = 25
+
+_KATAKANA_TO_HIRAGANA = {c: c - 0x60 for c in range(0x30A1, 0x30F7)}
+_NON_WORD = re.compile(r'[\W_]+')
+# Long vowels are spelled several ways in romaji (Tōhō, Touhou, Tohoh)
+_LONG_VOWELS = re.compile(r'(?<=[aeiou])(?:u|h(?![aeiouy]))|(?<=o)o|(?<=e)i(?![aeiou])')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    # Strip accents from latin letters only, kana dakuten are significant
+    out = []
+    for c in unicodedata.normalize('NFD', text):
+        if unicodedata.combining(c) and out and out[-1] < 'ɐ':
+            continue
+        out.append(c)
+    text = unicodedata.normalize('NFC', ''.join(out)).translate(_KATAKANA_TO_HIRAGANA)
+    text = ' '.join(_NON_WORD.sub(' ', text).split())
+    return _LONG_VOWELS.sub('', text)
+
+
+def trigrams(text, prefix=False):
+    # Padding at the start lets one and two character queries match word beginnings
+    padded = f"  {text}" if prefix else f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def start_key(text, length=2):
+    # Separate key space for the first one or two characters of a whole name
+    return f"\x01{text[:length]:\x01<2}"
+
+
+class TitleIndex:
+    def __init__(self):
+        self._ids = []
+        self._labels = []
+        # Normalized names of each entry joined by newlines, used to verify candidates
+        self._names = []
+        self._positions = {}
+        self._postings = {}
+        # Completions of one and two character queries, which match too many titles to rank per keystroke
+        self._short_queries = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, item_id, label, names=()):
+        normalized = "\n".join(dict.fromkeys(n for n in map(normalize, (label, *names)) if n))
+        position = self._positions.get(item_id)
+        if position is None:
+            position = self._positions[item_id] = len(self._ids)
+            self._ids.append(item_id)
+            self._labels.append(label)
+            self._names.append(normalized)
+        elif self._names[position] == normalized:
+            return
+        else:
+            self._labels[position] = label
+            self._names[position] = normalized
+
+        self._short_queries.clear()
+        grams = set()
+        for name in normalized.split("\n"):
+            grams.add(start_key(name, 1))
+            grams.add(start_key(name))
+            for word_start in (0, *(i + 1 for i, c in enumerate(name) if c == ' ')):
+                grams |= trigrams(name[word_start:])
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                self._postings[gram] = array('I', (position,))
+            elif posting[-1] != position:
+                posting.append(position)
+
+    def complete(self, text, limit=MAX_CHOICES):
+        query = normalize(text)
+        if not query:
+            return []
+        if len(query) <= 2 and limit == MAX_CHOICES:
+            found = self._short_queries.get(query)
+            if found is None:
+                found = self._short_queries[query] = self._complete(query, limit)
+            return found
+        return self._complete(query, limit)
+
+    def _complete(self, query, limit):
+        label_length = lambda p: len(self._labels[p])
+
+        # Titles starting with the query rank first. Postings are never pruned when an entry is renamed,
+        # so even short queries are checked against the current names.
+        starts = {
+            p for p in self._postings.get(start_key(query, min(len(query), 2)), ())
+            if self._names[p].startswith(query) or f"\n{query}" in self._names[p]
+        }
+        found = heapq.nsmallest(limit, starts, key=label_length)
+
+        if len(found) < limit:
+            # Then titles with a later word starting with the query, verified against the rarest trigram
+            postings = [self._postings.get(g) for g in trigrams(query, prefix=True)]
+            rarest = min(postings, key=lambda p: len(p) if p else 0)
+            if rarest:
+                words = {p for p in rarest if p not in starts and f" {query}" in self._names[p]}
+                found += heapq.nsmallest(limit - len(found), words, key=label_length)
+
+        return [(self._ids[p], self._labels[p]) for p in found]
+
+    def memory_usage(self):
+        size = sum(sys.getsizeof(x) for x in (self._ids, self._labels, self._names, self._positions, self._postings))
+        size += sum(sys.getsizeof(s) for s in self._labels) + sum(sys.getsizeof(s) for s in self._names)
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self._postings.items())
+        return size
+
+    def stats(self):
+        size = self.memory_usage()
+        return {
+            "titles": len(self),
+            "trigrams": len(self._postings),
+            "bytes": size,
+            "bytes_per_title": size / len(self) if self else 0,
+        }
@@ -0,0 +1,60 @@
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from metrics import COMMAND_LATENCY
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    # Tracing is optional, spans are only recorded when OpenTelemetry is installed and configured
+    trace = None
+
+# (interaction id, span) of the Discord interaction handled by the current task, inherited by tasks it starts
+current_interaction = ContextVar("current_interaction", default=(None, None))
+
+_tracer = trace.get_tracer("vnbot") if trace is not None else None
+
+
+def start_interaction(interaction, name):
+    # Runs in the task dedicated to this interaction, so the value set here stays with it
+    interaction.extras["started"] = time.perf_counter()
+    interaction.extras["name"] = name
+    span = None
+    if _tracer is not None:
+        span = _tracer.start_span(name, attributes={"discord.interaction_id": str(interaction.id)})
+        interaction.extras["span"] = span
+    current_interaction.set((interaction.id, span))
+
+
+def end_interaction(interaction, status="ok"):
+    responder = interaction.extras.pop("responder", None)
+    if responder is not None:
+        # A handler that failed before answering must not leave a defer pending
+        responder.cancel()
+    started = interaction.extras.pop("started", None)
+    if started is None:
+        return
+    # Handlers that answered with an error message mark it themselves
+    if status == "ok":
+        status = interaction.extras.get("status", status)
+    COMMAND_LATENCY.observe(time.perf_counter() - started, interaction.extras["name"], status)
+    span = interaction.extras.pop("span", None)
+    if span is not None:
+        span.set_attribute("vnbot.status", status)
+        span.end()
+
+
+def vndb_span(method, endpoint):
+    if _tracer is None:
+        return nullcontext()
+    interaction_id, parent = current_interaction.get()
+    attributes = {"http.request.method": method, "vndb.endpoint": endpoint}
+    if interaction_id is not None:
+        attributes["discord.interaction_id"] = str(interaction_id)
+    return _tracer.start_as_current_span(
+        f"VNDB {method} /{endpoint}",
+        context=trace.set_span_in_context(parent) if parent is not None else None,
+        kind=trace.SpanKind.CLIENT,
+        attributes=attributes,
+    )
@@ -0,0 +1,114 @@
+import discord
+
+from tracing import end_interaction, start_interaction
+
+# Discord caps custom_id at 100 characters
+CUSTOM_ID_LIMIT = 100
+
+PLACEHOLDERS = {
+    "vn": "Select a visual novel...",
+    "character": "Select a character...",
+    "cover": "Select a visual novel...",
+}
+
+# kind -> coroutine(interaction, selected_id), registered by the commands
+select_handlers = {}
+# kind -> coroutine(interaction, kind, query, sort, page)
+page_handlers = {}
+
+
+def on_select(kind):
+    def decorator(func):
+        select_handlers[kind] = func
+        return func
+    return decorator
+
+
+def on_page(*kinds):
+    def decorator(func):
+        for kind in kinds:
+            page_handlers[kind] = func
+        return func
+    return decorator
+
+
+# The selected option's value is the id, so the custom_id only needs the kind for dropdowns
+# to keep working on old messages after a restart. The optional id list matches dropdowns
+# sent by earlier versions.
+class ResultSelect(discord.ui.DynamicItem[discord.ui.Select], template=r'vndb:(?P<kind>vn|character|cover)(?::[a-z0-9,]*)?'):
+    def __init__(self, kind, options=None):
+        super().__init__(
+            discord.ui.Select(
+                custom_id=f"vndb:{kind}",
+                placeholder=PLACEHOLDERS[kind],
+                min_values=1,
+                max_values=1,
+                options=options or [],
+            )
+        )
+        self.kind = kind
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match):
+        return cls(match['kind'])
+
+    async def callback(self, interaction: discord.Interaction):
+        start_interaction(interaction, f"select:{self.kind}")
+        status = "error"
+        try:
+            await select_handlers[self.kind](interaction, self.item.values[0])
+            status = "ok"
+        finally:
+            end_interaction(interaction, status)
+
+
+def page_custom_id(kind, sort, page, query):
+    return f"vndb:page:{kind}:{sort}:{page}:{query}"
+
+
+# Like the dropdown, the buttons carry the query in their custom_id so paging works after a restart
+class PageButton(discord.ui.DynamicItem[discord.ui.Button], template=r'vndb:page:(?P<kind>vn|character|cover|series|compare):(?P<sort>[a-z]+):(?P<page>[0-9]+):(?P<query>.+)'):
+    def __init__(self, kind, sort, page, query, label, disabled=False):
+        super().__init__(
+            discord.ui.Button(
+                custom_id=page_custom_id(kind, sort, page, query),
+                label=label,
+                style=discord.ButtonStyle.secondary,
+                disabled=disabled,
+                row=1,
+            )
+        )
+        self.kind = kind
+        self.sort = sort
+        self.page = page
+        self.query = query
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['kind'], match['sort'], int(match['page']), match['query'], item.label)
+
+    async def callback(self, interaction: discord.Interaction):
+        start_interaction(interaction, f"page:{self.kind}")
+        status = "error"
+        try:
+            await page_handlers[self.kind](interaction, self.kind, self.query, self.sort, self.page)
+            status = "ok"
+        finally:
+            end_interaction(interaction, status)
+
+
+def add_page_buttons(view, kind, sort, page, query, more):
+    # Queries too long for a custom_id only get their first page
+    if (page > 1 or more) and len(page_custom_id(kind, sort, page + 1, query)) <= CUSTOM_ID_LIMIT:
+        view.add_item(PageButton(kind, sort, page - 1, query, "◀ Prev", disabled=page <= 1))
+        view.add_item(PageButton(kind, sort, page + 1, query, "Next ▶", disabled=not more))
+    return view
+
+
+def results_view(kind, options, query=None, sort=None, page=1, more=False):
+    view = discord.ui.View(timeout=None)
+    view.add_item(ResultSelect(kind, options))
+    if query is not None:
+        add_page_buttons(view, kind, sort, page, query, more)
+    return view
+
@@ -0,0 +1,204 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from batching import DetailBatcher
+from cache import ResponseCache, make_key
+from metrics import VNDB_INFLIGHT, VNDB_LATENCY
+from ratelimit import INTERACTIVE, RequestScheduler, as_ticket
+from tracing import vndb_span
+
+VNDB_API_URL = "https://api.vndb.org/kana"
+
+# Per-request timeout in seconds, overridable per call
+VNDB_TIMEOUT = float(os.getenv("VNDB_TIMEOUT", "10"))
+# Size of the keep-alive connection pool shared by every command
+VNDB_MAX_CONNECTIONS = int(os.getenv("VNDB_MAX_CONNECTIONS", "20"))
+
+
+class VNDBError(Exception):
+    def __init__(self, status, message="", retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+        super().__init__(f"VNDB returned {status}: {message}" if status else message)
+
+
+# Lets concurrent callers asking for the same key share one in-flight request
+class SingleFlight:
+    def __init__(self):
+        self.saved = 0
+        self._tasks = {}
+        self._tickets = {}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    async def run(self, key, factory, ticket=None):
+        task = self._tasks.get(key)
+        if task is not None:
+            self.saved += 1
+            # An interactive caller joining a prefetch must not wait in the background lane
+            shared = self._tickets.get(key)
+            if shared is not None and ticket is not None:
+                shared.raise_to(ticket.priority)
+        else:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            if ticket is not None:
+                self._tickets[key] = ticket
+            task.add_done_callback(lambda t: self._done(key, t))
+        # Shielded so a caller giving up does not cancel the request for everyone else
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            self._tickets.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+
+class VNDBClient:
+    def __init__(self, base_url=VNDB_API_URL, timeout=VNDB_TIMEOUT, max_connections=VNDB_MAX_CONNECTIONS, cache=None, shared_cache=None, scheduler=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = cache if cache is not None else ResponseCache()
+        # Optional cache shared with the other worker processes, checked after the local one
+        self.shared_cache = shared_cache
+        self.inflight = SingleFlight()
+        self.batcher = DetailBatcher(self._send_batch)
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._session = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Content-Type': 'application/json'},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self.cache.close()
+
+    async def _request(self, method, endpoint, payload=None, timeout=None, priority=INTERACTIVE):
+        return await self.scheduler.run(lambda: self._send(method, endpoint, payload, timeout), priority)
+
+    async def _send(self, method, endpoint, payload=None, timeout=None):
+        session = await self.start()
+        # aiohttp reads timeout=None as no timeout at all, not as the session default
+        request_timeout = aiohttp.ClientTimeout(total=timeout if timeout is not None else self.timeout)
+
+        status = "error"
+        started = time.perf_counter()
+        VNDB_INFLIGHT.inc()
+        try:
+            with vndb_span(method, endpoint):
+                async with session.request(method, f"{self.base_url}/{endpoint}", json=payload, timeout=request_timeout) as response:
+                    status = response.status
+                    if response.status != 200:
+                        retry_after = response.headers.get('Retry-After')
+                        raise VNDBError(
+                            response.status,
+                            (await response.text())[:200],
+                            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                        )
+                    return await response.json()
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise VNDBError(None, f"request to /{endpoint} timed out")
+        except aiohttp.ClientError as e:
+            raise VNDBError(None, str(e))
+        finally:
+            VNDB_INFLIGHT.dec()
+            VNDB_LATENCY.observe(time.perf_counter() - started, endpoint, status)
+
+    async def query(self, endpoint, filters=None, fields="", timeout=None, cache_ttl=None, priority=INTERACTIVE, **params) -> dict:
+        key = make_key(endpoint, filters, fields, **params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        ticket = as_ticket(priority)
+
+        async def fetch():
+            data = await self._shared_get(key, cache_ttl)
+            if data is not None:
+                self.cache.set(key, data, ttl=cache_ttl)
+                return data
+            payload = {"fields": fields, **params}
+            if filters is not None:
+                payload["filters"] = filters
+            data = await self._request("POST", endpoint, payload, timeout=timeout, priority=ticket)
+            if cache_ttl != 0:
+                self.cache.set(key, data, ttl=cache_ttl)
+                await self._shared_set(key, data, cache_ttl)
+            return data
+
+        return await self.inflight.run(key, fetch, ticket)
+
+    async def vn(self, filters=None, fields="", timeout=None, cache_ttl=None, priority=INTERACTIVE, **params) -> dict:
+        return await self.query("vn", filters, fields, timeout=timeout, cache_ttl=cache_ttl, priority=priority, **params)
+
+    async def character(self, filters=None, fields="", timeout=None, cache_ttl=None, priority=INTERACTIVE, **params) -> dict:
+        return await self.query("character", filters, fields, timeout=timeout, cache_ttl=cache_ttl, priority=priority, **params)
+
+    async def get(self, endpoint, item_id, fields, cache_ttl=None, priority=INTERACTIVE):
+        key = make_key(endpoint, ["id", "=", item_id], fields)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return (cached.get('results') or [None])[0]
+        ticket = as_ticket(priority)
+
+        async def fetch():
+            data = await self._shared_get(key, cache_ttl)
+            if data is not None:
+                self.cache.set(key, data, ttl=cache_ttl)
+                return (data.get('results') or [None])[0]
+            result = await self.batcher.load(endpoint, fields, item_id, ticket)
+            if cache_ttl != 0:
+                data = {"results": [result] if result else [], "more": False}
+                self.cache.set(key, data, ttl=cache_ttl)
+                await self._shared_set(key, data, cache_ttl)
+            return result
+
+        return await self.inflight.run(key, fetch, ticket)
+
+    async def _shared_get(self, key, cache_ttl):
+        if self.shared_cache is None or cache_ttl == 0:
+            return None
+        return await self.shared_cache.get(key)
+
+    async def _shared_set(self, key, data, cache_ttl):
+        if self.shared_cache is not None:
+            await self.shared_cache.set(key, data, self.cache.ttl if cache_ttl is None else cache_ttl)
+
+    async def get_many(self, endpoint, item_ids, fields, cache_ttl=None, priority=INTERACTIVE):
+        item_ids = list(dict.fromkeys(item_ids))
+        results = await asyncio.gather(*(self.get(endpoint, i, fields, cache_ttl=cache_ttl, priority=priority) for i in item_ids))
+        return dict(zip(item_ids, results))
+
+    async def get_vn(self, vn_id, fields, cache_ttl=None, priority=INTERACTIVE):
+        return await self.get("vn", vn_id, fields, cache_ttl=cache_ttl, priority=priority)
+
+    async def get_vns(self, vn_ids, fields, cache_ttl=None, priority=INTERACTIVE):
+        return await self.get_many("vn", vn_ids, fields, cache_ttl=cache_ttl, priority=priority)
+
+    async def get_character(self, char_id, fields, cache_ttl=None, priority=INTERACTIVE):
+        return await self.get("character", char_id, fields, cache_ttl=cache_ttl, priority=priority)
+
+    async def get_characters(self, char_ids, fields, cache_ttl=None, priority=INTERACTIVE):
+        return await self.get_many("character", char_ids, fields, cache_ttl=cache_ttl, priority=priority)
+
+    async def _send_batch(self, endpoint, filters, fields, results, priority):
+        return await self._request("POST", endpoint, {"filters": filters, "fields": fields, "results": results}, priority=priority)
+
+    async def stats(self, timeout=None, priority=INTERACTIVE) -> dict:
+        return await self._request("GET", "stats", timeout=timeout, priority=priority)